@@ -0,0 +1,89 @@
+"""
+চলমান সার্ভারের বিপরীতে পেজ বেঞ্চমার্ক।
+
+ব্যবহার:
+    python bench.py http://localhost:5000 --detail <movie_id> [--runs 20]
+    python bench.py --importtime [--import-budget-ms 800]
+
+প্রতিটি পেজের জন্য bytes-on-wire (কমপ্রেসড বডি + হেডার) এবং time-to-first-byte রিপোর্ট করে।
+--importtime দিলে `python -X importtime -c "import bot"` চালিয়ে কোল্ড-স্টার্ট সময় বাজেটের সাথে মেলানো হয়।
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import requests
+
+IMPORT_BUDGET_MS = 800
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+def measure(url, encoding):
+    start = time.perf_counter()
+    res = requests.get(url, headers={"Accept-Encoding": encoding}, stream=True, timeout=30)
+    first_chunk = next(res.raw.stream(1, decode_content=False), b"")
+    ttfb = time.perf_counter() - start
+    body = first_chunk + res.raw.read(decode_content=False)
+    header_bytes = sum(len(k) + len(v) + 4 for k, v in res.headers.items())
+    return {"status": res.status_code, "ttfb": ttfb, "bytes": len(body) + header_bytes, "encoding": res.headers.get("Content-Encoding", "identity")}
+
+def run_page(name, url, runs):
+    for encoding in ENCODINGS:
+        results = [measure(url, encoding) for _ in range(runs)]
+        ttfbs = sorted(r["ttfb"] * 1000 for r in results)
+        p95 = ttfbs[min(len(ttfbs) - 1, int(len(ttfbs) * 0.95))]
+        print(f"{name:<8} {encoding:<9} -> {results[-1]['encoding']:<9} status={results[-1]['status']} "
+              f"bytes={results[-1]['bytes']:>8} ttfb_median={statistics.median(ttfbs):7.1f}ms ttfb_p95={p95:7.1f}ms")
+
+def measure_import(runs, budget_ms):
+    """bot মডিউল import করার cumulative সময় (মাইক্রোসেকেন্ড থেকে ms) এবং সবচেয়ে ভারী import গুলো।"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    totals, heaviest = [], []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import bot"], cwd=here, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import bot failed")
+            return False
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line or "cumulative" in line: continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), name))
+        bot_index = next(i for i, (_, name) in enumerate(rows) if name.strip() == "bot")
+        totals.append(rows[bot_index][0] / 1000)
+        # importtime চাইল্ড মডিউলগুলো প্যারেন্টের আগে লেখে; bot এর সরাসরি import গুলো ঠিক তার আগের এক-লেভেল লাইনগুলো
+        children = []
+        for us, name in reversed(rows[:bot_index]):
+            if not name.startswith("   "): break
+            if not name.startswith("     "): children.append((us, name.strip()))
+        heaviest = sorted(children, reverse=True)[:5]
+    median = statistics.median(totals)
+    print(f"import bot: median={median:.1f}ms min={min(totals):.1f}ms budget={budget_ms}ms ({'OK' if median <= budget_ms else 'OVER BUDGET'})")
+    for us, name in heaviest:
+        print(f"  {name:<40} {us / 1000:7.1f}ms")
+    return median <= budget_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bytes-on-wire and TTFB for key pages.")
+    parser.add_argument("base_url", nargs="?")
+    parser.add_argument("--detail", help="movie _id used for the detail page")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--importtime", action="store_true", help="measure cold-start import time of bot.py")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    if args.importtime:
+        ok = measure_import(min(args.runs, 5), args.import_budget_ms)
+        if not args.base_url: sys.exit(0 if ok else 1)
+    if not args.base_url:
+        parser.error("base_url is required unless --importtime is given")
+    base = args.base_url.rstrip("/")
+
+    run_page("home", f"{base}/", args.runs)
+    if args.detail:
+        run_page("detail", f"{base}/movie/{args.detail}", args.runs)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,46 @@
 import os
 import sys
+import atexit
 import re
+import io
+import json
+import gzip
+import hashlib
+import math
+import time
+import threading
+import socket
 import requests
-from flask import Flask, render_template_string, request, redirect, url_for, Response, jsonify
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, request, redirect, url_for, Response, jsonify, send_file, abort, stream_with_context
+from pymongo import MongoClient, ReturnDocument, UpdateOne, UpdateMany, DeleteMany
+from pymongo.errors import OperationFailure, BulkWriteError, DuplicateKeyError
+from werkzeug.middleware.proxy_fix import ProxyFix
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from bson import json_util
 from functools import wraps
+from contextlib import contextmanager
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from email.utils import format_datetime
+from xml.sax.saxutils import escape as xml_escape
 from apscheduler.schedulers.background import BackgroundScheduler
 
+# ঐচ্ছিক প্যাকেজ: ইনস্টল না থাকলে gzip/JSON দিয়েই কাজ চলবে
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # ======================================================================
 # --- আপনার ব্যক্তিগত ও অ্যাডমিন তথ্য (এনভায়রনমেন্ট থেকে লোড হবে) ---
 # ======================================================================
@@ -20,6 +52,27 @@ BOT_USERNAME = os.environ.get("BOT_USERNAME")
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
 
+# --- ঐচ্ছিক সেটিংস (না দিলে ডিফল্ট মান ব্যবহার হবে) ---
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_MB = int(os.environ.get("IMAGE_CACHE_MAX_MB", 512))
+# রিভার্স প্রক্সির সংখ্যা (X-Forwarded-For থেকে আসল IP পাওয়ার জন্য)।
+# Render/Heroku/Koyeb এর মতো প্ল্যাটফর্ম প্রক্সির পেছনে চালালে 1 দিন; 0 থাকলে সব ভিজিটর
+# প্রক্সির একই IP শেয়ার করে এবং contact/search রেট লিমিট পুরো সাইটের জন্য একসাথে ফুরিয়ে যায়।
+PROXY_COUNT = int(os.environ.get("PROXY_COUNT", 0))
+# টেস্টের সময় লোকাল স্টাব সার্ভার ব্যবহার করার জন্য বদলানো যায়
+TMDB_API_BASE = os.environ.get("TMDB_API_BASE", "https://api.themoviedb.org/3").rstrip("/")
+TMDB_REFRESH_HOURS = int(os.environ.get("TMDB_REFRESH_HOURS", 24))
+TMDB_REFRESH_WORKERS = int(os.environ.get("TMDB_REFRESH_WORKERS", 8))
+# "memory" অথবা "mongo" (একাধিক ওয়ার্কার/হোস্টে শেয়ার্ড লিমিটের জন্য)
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+# উদাহরণ: "contact=5/3600,search=30/60"
+RATE_LIMITS_SPEC = os.environ.get("RATE_LIMITS", "")
+# টেস্টের সময় লোকাল ফেক Bot API সার্ভার ব্যবহার করার জন্য বদলানো যায়
+TELEGRAM_API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+# ফাইল যাচাইয়ের কপি যে প্রাইভেট চ্যাটে যাবে (না দিলে ব্যাকগ্রাউন্ড যাচাই বন্ধ থাকে)
+TELEGRAM_VERIFY_CHAT_ID = os.environ.get("TELEGRAM_VERIFY_CHAT_ID")
+TELEGRAM_VERIFY_BATCH = int(os.environ.get("TELEGRAM_VERIFY_BATCH", 60))
+
 # --- প্রয়োজনীয় ভেরিয়েবলগুলো সেট করা হয়েছে কিনা তা পরীক্ষা করা ---
 required_vars = {
     "MONGO_URI": MONGO_URI, "BOT_TOKEN": BOT_TOKEN, "TMDB_API_KEY": TMDB_API_KEY,
@@ -27,17 +80,21 @@ required_vars = {
     "ADMIN_USERNAME": ADMIN_USERNAME, "ADMIN_PASSWORD": ADMIN_PASSWORD,
 }
 
-missing_vars = [name for name, value in required_vars.items() if not value]
-if missing_vars:
-    print(f"FATAL: Missing required environment variables: {', '.join(missing_vars)}")
-    print("Please set these variables in your deployment environment and restart the application.")
-    sys.exit(1)
+def check_required_env():
+    """সার্ভার বা CLI কমান্ড চালুর সময় ডাকা হয়; শুধু import করলে কোনো কিছু বন্ধ হয় না।"""
+    missing_vars = [name for name, value in required_vars.items() if not value]
+    if missing_vars:
+        print(f"FATAL: Missing required environment variables: {', '.join(missing_vars)}")
+        print("Please set these variables in your deployment environment and restart the application.")
+    return missing_vars
 
 # ======================================================================
 
 # --- অ্যাপ্লিকেশন সেটআপ ---
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{BOT_TOKEN}"
+TELEGRAM_API_URL = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}"
 app = Flask(__name__)
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
 
 # --- অ্যাডমিন অথেন্টিকেশন ফাংশন ---
 def check_auth(username, password):
@@ -55,24 +112,262 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
-# --- ডাটাবেস কানেকশন ---
-try:
-    client = MongoClient(MONGO_URI)
-    db = client["movie_db"]
-    movies = db["movies"]
-    settings = db["settings"]
-    feedback = db["feedback"]
-    print("SUCCESS: Successfully connected to MongoDB!")
-except Exception as e:
-    print(f"FATAL: Error connecting to MongoDB: {e}. Exiting.")
-    sys.exit(1)
+# --- ডাটাবেস কানেকশন (প্রথমবার ব্যবহারের সময় তৈরি হয়) ---
+mongo_lock = threading.Lock()
+mongo_state = {"client": None}
+
+def get_client():
+    if mongo_state["client"] is None:
+        with mongo_lock:
+            if mongo_state["client"] is None:
+                mongo_state["client"] = MongoClient(MONGO_URI)
+                print("SUCCESS: MongoDB client created.")
+    return mongo_state["client"]
+
+def get_db():
+    return get_client()["movie_db"]
+
+class LazyCollection:
+    """কালেকশনের কোনো মেথড প্রথমবার ব্যবহার করলে তবেই MongoDB কানেকশন তৈরি হয়।"""
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+movies = LazyCollection("movies")
+settings = LazyCollection("settings")
+feedback = LazyCollection("feedback")
+rate_limits = LazyCollection("rate_limits")
+events = LazyCollection("events")
+title_stats = LazyCollection("title_stats_hourly")
+meta = LazyCollection("meta")
+bulk_jobs = LazyCollection("bulk_jobs")
+series_episodes = LazyCollection("episodes")
+
+def ensure_indexes():
+    title_stats.create_index("hour")
+    events.create_index("ts", expireAfterSeconds=EVENTS_RETENTION_DAYS * 24 * 3600)
+    series_episodes.create_index([("series_id", 1), ("season", 1), ("episode_number", 1)], unique=True)
+    series_episodes.create_index("broken", sparse=True)
+    movies.create_index("files.broken", sparse=True)
+    if RATE_LIMIT_BACKEND == "mongo":
+        rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+# --- ইন-প্রসেস ক্যাশ রেজিস্ট্রি ---
+# প্রতিটি এন্ট্রির সাথে কিছু ট্যাগ থাকে (যেমন "home", "title:<id>", "genre:Action");
+# কোনো পরিবর্তন হলে শুধু সংশ্লিষ্ট ট্যাগের এন্ট্রিগুলো মুছে ফেলা হয়।
+CACHE_TTL = 300
+INVALIDATION_POLL_SECONDS = 5
+INVALIDATION_LOG_SIZE = 200
+# প্রতিটি ক্যাশের এন্ট্রি সংখ্যা সীমিত (LRU), যাতে URL থেকে আসা কী দিয়ে মেমরি অসীম না বাড়ে
+CACHE_MAX_ENTRIES = 1000
+CACHE_LIMITS = {"pages": 10, "settings": 10, "taxonomy": 10, "lists": 500}
+cache_lock = threading.Lock()
+cache_registry = {}  # cache name -> OrderedDict {key: (expires_at, tags, value)}, পুরনো ব্যবহার আগে
+
+def cached(name, key, loader, tags=(), ttl=CACHE_TTL):
+    now = time.time()
+    with cache_lock:
+        entries = cache_registry.setdefault(name, OrderedDict())
+        entry = entries.get(key)
+        if entry and entry[0] > now:
+            entries.move_to_end(key)
+            return entry[2]
+    value = loader()
+    if callable(tags): tags = tags(value)
+    with cache_lock:
+        entries[key] = (now + ttl, frozenset(tags) | {name}, value)
+        entries.move_to_end(key)
+        limit = CACHE_LIMITS.get(name, CACHE_MAX_ENTRIES)
+        # মেয়াদ শেষ হওয়া বা সবচেয়ে কম ব্যবহৃত এন্ট্রি আগে বাদ পড়ে
+        while len(entries) > limit or (entries and next(iter(entries.values()))[0] <= now):
+            entries.popitem(last=False)
+    return value
+
+def tag_matches(entry_tags, tag):
+    if tag == "*": return True
+    if tag.endswith(":*"): return any(t.startswith(tag[:-1]) for t in entry_tags)
+    return tag in entry_tags
+
+def invalidate_tags(tags):
+    with cache_lock:
+        for entries in cache_registry.values():
+            for key in [k for k, e in entries.items() if any(tag_matches(e[1], tag) for tag in tags)]:
+                del entries[key]
+
+def movie_tags(*docs):
+    """একটি কনটেন্ট পরিবর্তন হলে কোন কোন ক্যাশ ট্যাগ বাতিল হবে।"""
+    tags = {"home", "taxonomy"}
+    for doc in docs:
+        if not doc: continue
+        if doc.get("_id"): tags.add(f"title:{doc['_id']}")
+        tags.update(f"genre:{g}" for g in doc.get("genres") or [])
+        if doc.get("poster_badge"): tags.add(f"badge:{doc['poster_badge']}")
+    return tags
+
+# --- ক্যাটালগ ভার্সন ও ইনভ্যালিডেশন লগ ---
+# প্রতিটি লেখার পর meta ডকুমেন্টের version বাড়ে এবং ট্যাগগুলো ছোট একটি লগে রাখা হয়,
+# যাতে change stream না থাকলেও অন্য ওয়ার্কাররা পোলিং করে একই ট্যাগ বাতিল করতে পারে।
+def publish_invalidation(scope, tags):
+    tags = sorted(set(tags))
+    invalidate_tags(tags)
+    meta.update_one({"_id": scope}, {
+        "$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()},
+        "$push": {"recent": {"$each": [tags], "$slice": -INVALIDATION_LOG_SIZE}},
+    }, upsert=True)
+
+def get_catalog_version():
+    doc = meta.find_one({"_id": "catalog"}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+def change_to_tags(change):
+    """MongoDB change stream ইভেন্ট থেকে ক্যাশ ট্যাগ বের করা।"""
+    if change["ns"]["coll"] == "settings": return {"settings"}
+    if change["ns"]["coll"] == "episodes":
+        series_id = (change.get("fullDocument") or {}).get("series_id")
+        # delete ইভেন্টে series_id পাওয়া যায় না, তখন সব এপিসোড/সিজন ক্যাশ বাতিল
+        return {f"title:{series_id}"} if series_id else {"episodes", "seasons"}
+    doc_id = change.get("documentKey", {}).get("_id")
+    full = change.get("fullDocument") or {}
+    tags = movie_tags({"_id": doc_id, "genres": full.get("genres"), "poster_badge": full.get("poster_badge")})
+    # পুরনো genre/badge জানা না থাকলে (delete বা ঐ ফিল্ড আপডেট) ঐ ধরনের সব এন্ট্রি বাতিল
+    changed = set((change.get("updateDescription") or {}).get("updatedFields", {})) | set((change.get("updateDescription") or {}).get("removedFields", []))
+    if change["operationType"] in ("delete", "replace") or any(f.startswith("genres") for f in changed): tags.add("genre:*")
+    if change["operationType"] in ("delete", "replace") or "poster_badge" in changed: tags.add("badge:*")
+    return tags
+
+invalidation_state = {"mode": "starting", "versions": {}}
+
+def poll_invalidations():
+    """Change stream না থাকলে (standalone MongoDB) meta ডকুমেন্ট পোল করে ক্যাশ বাতিল করা হয়।"""
+    if invalidation_state["mode"] == "change_stream": return
+    for doc in meta.find({"_id": {"$in": ["catalog", "settings"]}}):
+        last = invalidation_state["versions"].get(doc["_id"])
+        version, recent = doc.get("version", 0), doc.get("recent", [])
+        invalidation_state["versions"][doc["_id"]] = version
+        if last is None or version <= last: continue
+        if version - last > len(recent):
+            invalidate_tags({"*"})
+        else:
+            for tags in recent[len(recent) - (version - last):]:
+                invalidate_tags(tags)
+
+def watch_invalidations():
+    """movies, episodes ও settings কালেকশনের change stream থেকে সব ওয়ার্কারের ক্যাশ বাতিল করা হয়।"""
+    resume_token = None
+    while True:
+        try:
+            with get_db().watch([{"$match": {"ns.coll": {"$in": ["movies", "episodes", "settings"]}}}], full_document="updateLookup", resume_after=resume_token) as stream:
+                invalidation_state["mode"] = "change_stream"
+                for change in stream:
+                    resume_token = stream.resume_token
+                    invalidate_tags(change_to_tags(change))
+        except OperationFailure as e:
+            # Replica set না হলে change stream সাপোর্ট করে না; তখন পোলিং চলবে
+            print(f"Change streams unavailable ({e}); falling back to polling.")
+            invalidation_state["mode"] = "polling"
+            return
+        except Exception as e:
+            print(f"Change stream interrupted: {e}; reconnecting.")
+            invalidation_state["mode"] = "polling"
+            invalidate_tags({"*"})
+            time.sleep(INVALIDATION_POLL_SECONDS)
 
 # --- Context Processor: বিজ্ঞাপনের কোড সহজলভ্য করার জন্য ---
 @app.context_processor
 def inject_ads():
-    ad_codes = settings.find_one()
+    ad_codes = cached("settings", "ads", lambda: settings.find_one(), tags={"settings"})
     return dict(ad_settings=(ad_codes or {}), bot_username=BOT_USERNAME)
 
+# --- রেট লিমিটিং (sliding window, প্রতি IP / প্রতি Telegram chat_id) ---
+DEFAULT_RATE_LIMITS = "contact=5/3600,search=30/60,start=10/60,api=120/60"
+
+def parse_rate_limits(spec):
+    limits = {}
+    for item in spec.split(','):
+        if '=' not in item or '/' not in item: continue
+        route, rule = item.split('=', 1)
+        count, period = rule.split('/', 1)
+        limits[route.strip()] = (int(count), int(period))
+    return limits
+
+RATE_LIMITS = {**parse_rate_limits(DEFAULT_RATE_LIMITS), **parse_rate_limits(RATE_LIMITS_SPEC)}
+rate_limit_lock = threading.Lock()
+rate_limit_windows = {}  # (route, key) -> [window, previous_count, current_count]
+rate_limit_blocked = {}  # (route, key) -> শেয়ার্ড স্টোর যে সময় পর্যন্ত ব্লক করেছে
+rate_limit_stats = {route: {"allowed": 0, "rejected": 0} for route in RATE_LIMITS}
+
+proxy_warning = {"shown": False}
+
+def client_ip():
+    if not PROXY_COUNT and not proxy_warning["shown"] and request.headers.get('X-Forwarded-For'):
+        proxy_warning["shown"] = True
+        print("WARNING: Requests carry X-Forwarded-For but PROXY_COUNT is 0; all visitors share the proxy's IP "
+              "for rate limiting. Set PROXY_COUNT to the number of proxies in front of the app.")
+    return request.remote_addr or "unknown"
+
+def window_estimate(previous, current, now, period):
+    return previous * (1 - (now % period) / period) + current
+
+def shared_window_hit(route, key, now, limit, period):
+    """MongoDB তে শেয়ার্ড কাউন্টার বাড়ায়; লিমিট ছাড়ালে True রিটার্ন করে।"""
+    window = int(now // period)
+    prefix = f"{route}:{key}"
+    current = rate_limits.find_one_and_update(
+        {"_id": f"{prefix}:{window}"},
+        {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": datetime.utcfromtimestamp((window + 2) * period)}},
+        upsert=True, return_document=ReturnDocument.AFTER)
+    previous = rate_limits.find_one({"_id": f"{prefix}:{window - 1}"}) or {}
+    return window_estimate(previous.get("count", 0), current["count"] - 1, now, period) >= limit
+
+def rate_limit_exceeded(route, key):
+    """অনুমতি থাকলে 0, নাহলে কত সেকেন্ড পর আবার চেষ্টা করা যাবে তা রিটার্ন করে।
+    রিজেক্ট করার সিদ্ধান্ত সবসময় মেমরি থেকেই হয়, ডাটাবেসে যায় না।"""
+    if route not in RATE_LIMITS: return 0
+    limit, period = RATE_LIMITS[route]
+    now = time.time()
+    retry_after = math.ceil(period - now % period)
+    slot = (route, str(key))
+    with rate_limit_lock:
+        if rate_limit_blocked.get(slot, 0) > now:
+            rate_limit_stats[route]["rejected"] += 1
+            return retry_after
+        window = int(now // period)
+        entry = rate_limit_windows.get(slot)
+        if entry is None or entry[0] < window - 1: entry = [window, 0, 0]
+        elif entry[0] == window - 1: entry = [window, entry[2], 0]
+        if window_estimate(entry[1], entry[2], now, period) >= limit:
+            rate_limit_windows[slot] = entry
+            rate_limit_stats[route]["rejected"] += 1
+            return retry_after
+        entry[2] += 1
+        rate_limit_windows[slot] = entry
+        if len(rate_limit_windows) > 50000:
+            for old_slot in [k for k, e in rate_limit_windows.items() if e[0] < window - 1]:
+                del rate_limit_windows[old_slot]
+    if RATE_LIMIT_BACKEND == "mongo":
+        try:
+            if shared_window_hit(route, key, now, limit, period):
+                with rate_limit_lock:
+                    rate_limit_blocked[slot] = now + retry_after
+                    rate_limit_stats[route]["rejected"] += 1
+                return retry_after
+        except Exception as e:
+            print(f"Rate limit store error: {e}")
+    with rate_limit_lock:
+        rate_limit_stats[route]["allowed"] += 1
+    return 0
+
+def too_many_requests(retry_after):
+    return Response('Too many requests. Please try again later.', 429, {'Retry-After': str(retry_after)})
+
+# --- বাইরের সার্ভিসের শেষ সফল কলের সময় (/readyz এ দেখানো হয়) ---
+dependency_last_ok = {"tmdb": None, "telegram": None}
+
+def mark_dependency_ok(name):
+    dependency_last_ok[name] = datetime.utcnow()
+
 # --- মেসেজ অটো-ডিলিট ফাংশন এবং সিডিউলার সেটআপ ---
 def delete_message_after_delay(chat_id, message_id):
     """নির্দিষ্ট সময় পর টেলিগ্রাম মেসেজ ডিলিট করার ফাংশন।"""
@@ -82,28 +377,114 @@ def delete_message_after_delay(chat_id, message_id):
         payload = {'chat_id': chat_id, 'message_id': message_id}
         response = requests.post(url, json=payload)
         if response.json().get('ok'):
+            mark_dependency_ok("telegram")
             print(f"Successfully deleted message {message_id} from chat {chat_id}")
         else:
             print(f"Failed to delete message: {response.text}")
     except Exception as e:
         print(f"Error in delete_message_after_delay: {e}")
 
-# সিডিউলার তৈরি এবং চালু করা
+# সিডিউলার তৈরি (চালু হয় শুধু সার্ভার মোডে, start_background_services() থেকে)
 scheduler = BackgroundScheduler(daemon=True)
-scheduler.start()
+
+# --- অ্যানালিটিক্স: ইভেন্ট মেমরিতে জমিয়ে ব্যাচে লেখা হয় ---
+ANALYTICS_FLUSH_SIZE = 500
+ANALYTICS_FLUSH_SECONDS = 30
+TRENDING_WINDOW_HOURS = 48
+# কাঁচা ইভেন্ট লগ শুধু ডিবাগের জন্য; trending hourly রোলআপ থেকে হিসাব হয়, তাই কয়েক দিন পর মুছে যায়
+EVENTS_RETENTION_DAYS = TRENDING_WINDOW_HOURS // 24 + 5
+TRENDING_SIZE = 24
+# ডেলিভারি (টেলিগ্রাম থেকে ফাইল নেওয়া) পেজ ভিউ এর চেয়ে বেশি গুরুত্বপূর্ণ
+TRENDING_WEIGHTS = {"delivery": 3, "page_view": 1}
+analytics_lock = threading.Lock()
+analytics_buffer = []
+analytics_state = {"flush_pending": False}  # বাফার ভরলে একটির বেশি ফ্লাশ জব যেন সিডিউল না হয়
+
+def track_event(event_type, title_id, **fields):
+    """ইভেন্ট শুধু মেমরি বাফারে যোগ হয়; বাফার ভরে গেলে ব্যাকগ্রাউন্ডে ফ্লাশ হয়।"""
+    event = {"type": event_type, "title_id": str(title_id), "ts": datetime.utcnow(), **fields}
+    with analytics_lock:
+        analytics_buffer.append(event)
+        full = len(analytics_buffer) >= ANALYTICS_FLUSH_SIZE and not analytics_state["flush_pending"]
+        if full: analytics_state["flush_pending"] = True
+    if full:
+        scheduler.add_job(func=flush_analytics)
+
+def flush_analytics():
+    global analytics_buffer
+    with analytics_lock:
+        batch, analytics_buffer = analytics_buffer, []
+        analytics_state["flush_pending"] = False
+    if not batch: return
+    counters = {}
+    for event in batch:
+        hour = event["ts"].replace(minute=0, second=0, microsecond=0)
+        key = (event["title_id"], hour)
+        counters.setdefault(key, {})
+        counters[key][event["type"]] = counters[key].get(event["type"], 0) + 1
+    try:
+        events.insert_many(batch, ordered=False)
+        title_stats.bulk_write([
+            UpdateOne({"_id": f"{title_id}:{hour:%Y%m%d%H}"},
+                      {"$inc": counts, "$setOnInsert": {"title_id": title_id, "hour": hour}}, upsert=True)
+            for (title_id, hour), counts in counters.items()
+        ], ordered=False)
+    except Exception as e:
+        print(f"Analytics flush failed ({len(batch)} events): {e}")
+
+def refresh_trending():
+    """গত কয়েক ঘণ্টার ডেটা দেখে is_trending ফ্ল্যাগ আপডেট করা হয় (পিন করা কনটেন্ট সবসময় থাকে)।"""
+    since = datetime.utcnow() - timedelta(hours=TRENDING_WINDOW_HOURS)
+    score_expr = {"$add": [{"$multiply": [{"$ifNull": [f"${name}", 0]}, weight]} for name, weight in TRENDING_WEIGHTS.items()]}
+    ranked = list(title_stats.aggregate([
+        {"$match": {"hour": {"$gte": since}}},
+        {"$group": {"_id": "$title_id", "score": {"$sum": score_expr}}},
+        {"$sort": {"score": -1}},
+        {"$limit": TRENDING_SIZE},
+    ]))
+    # এখনো কোনো ডেটা না থাকলে আগের ফ্ল্যাগগুলো যেমন আছে তেমন থাকবে
+    if not ranked: return
+    top_ids = [ObjectId(r["_id"]) for r in ranked if ObjectId.is_valid(r["_id"])]
+    ops = [UpdateOne({"_id": ObjectId(r["_id"])}, {"$set": {"is_trending": True, "trending_score": r["score"]}}) for r in ranked if ObjectId.is_valid(r["_id"])]
+    ops.append(UpdateMany({"_id": {"$nin": top_ids}, "is_trending": True, "trending_pinned": {"$ne": True}}, {"$set": {"is_trending": False}, "$unset": {"trending_score": ""}}))
+    movies.bulk_write(ops, ordered=False)
+    publish_invalidation("catalog", {"home"})
+
+
+# --- হেলথ চেক: ব্যাকগ্রাউন্ডে রিফ্রেশ হয়, প্রোব কখনো বাইরের সার্ভিসের জন্য অপেক্ষা করে না ---
+HEALTH_CHECK_SECONDS = 10
+health_state = {"checked_at": None, "mongo": {"ok": False, "latency_ms": None}}
+
+def refresh_health():
+    start = time.perf_counter()
+    try:
+        get_client().admin.command('ping')
+        mongo = {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        # /readyz পাবলিক, তাই এররের বিস্তারিত (হোস্ট, রেপ্লিকা সেট) শুধু লগে যায়
+        print(f"Health check: MongoDB ping failed: {e}")
+        mongo = {"ok": False, "latency_ms": None}
+    try:
+        queued_bulk_jobs = bulk_jobs.count_documents({"status": {"$in": ["queued", "running"]}})
+    except Exception:
+        queued_bulk_jobs = None
+    now = datetime.now(scheduler.timezone)
+    jobs = scheduler.get_jobs()
+    health_state.update({
+        "checked_at": datetime.utcnow(),
+        "mongo": mongo,
+        "scheduler": {
+            "running": scheduler.running, "jobs": len(jobs),
+            "overdue_jobs": sum(1 for job in jobs if job.next_run_time and job.next_run_time < now - timedelta(seconds=HEALTH_CHECK_SECONDS)),
+            "analytics_buffer": len(analytics_buffer), "bulk_jobs_pending": queued_bulk_jobs,
+        },
+    })
 
 
 # ======================================================================
-# --- HTML টেমপ্লেট ---
+# --- স্ট্যাটিক CSS / JS (ফিঙ্গারপ্রিন্ট করা URL দিয়ে সার্ভ হয়) ---
 # ======================================================================
-index_html = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-<meta charset="UTF-8" />
-<meta name="viewport" content="width=device-width, initial-scale=1.0, user-scalable=no" />
-<title>movieflix9u - Your Entertainment Hub</title>
-<style>
+site_css = """
   @import url('https://fonts.googleapis.com/css2?family=Bebas+Neue&family=Roboto:wght@400;500;700&display=swap');
   :root { --netflix-red: #E50914; --netflix-black: #141414; --text-light: #f5f5f5; --text-dark: #a0a0a0; --nav-height: 60px; }
   * { box-sizing: border-box; margin: 0; padding: 0; }
@@ -187,7 +568,110 @@ index_html = """
       .telegram-join-section { margin: 50px -15px -30px -15px; }
       .telegram-join-section h2 { font-size: 2rem; } .telegram-join-section p { font-size: 1rem; }
   }
-</style>
+"""
+
+site_js = """
+    const nav = document.querySelector('.main-nav');
+    window.addEventListener('scroll', () => { window.scrollY > 50 ? nav.classList.add('scrolled') : nav.classList.remove('scrolled'); });
+    document.addEventListener('DOMContentLoaded', function() { const slides = document.querySelectorAll('.hero-slide'); if (slides.length > 1) { let currentSlide = 0; const showSlide = (index) => slides.forEach((s, i) => s.classList.toggle('active', i === index)); setInterval(() => { currentSlide = (currentSlide + 1) % slides.length; showSlide(currentSlide); }, 5000); } });
+"""
+
+detail_css = """
+  @import url('https://fonts.googleapis.com/css2?family=Bebas+Neue&family=Roboto:wght@400;500;700&display=swap');
+  :root { --netflix-red: #E50914; --netflix-black: #141414; --text-light: #f5f5f5; --text-dark: #a0a0a0; }
+  * { box-sizing: border-box; margin: 0; padding: 0; }
+  body { font-family: 'Roboto', sans-serif; background: var(--netflix-black); color: var(--text-light); }
+  .detail-header { position: absolute; top: 0; left: 0; right: 0; padding: 20px 50px; z-index: 100; }
+  .back-button { color: var(--text-light); font-size: 1.2rem; font-weight: 700; text-decoration: none; display: flex; align-items: center; gap: 10px; transition: color 0.3s ease; }
+  .back-button:hover { color: var(--netflix-red); }
+  .detail-hero { position: relative; width: 100%; display: flex; align-items: center; justify-content: center; padding: 100px 0; }
+  .detail-hero-background { position: absolute; top: 0; left: 0; right: 0; bottom: 0; background-size: cover; background-position: center; filter: blur(20px) brightness(0.4); transform: scale(1.1); }
+  .detail-hero::after { content: ''; position: absolute; top: 0; left: 0; right: 0; bottom: 0; background: linear-gradient(to top, rgba(20,20,20,1) 0%, rgba(20,20,20,0.6) 50%, rgba(20,20,20,1) 100%); }
+  .detail-content-wrapper { position: relative; z-index: 2; display: flex; gap: 40px; max-width: 1200px; padding: 0 50px; width: 100%; }
+  .detail-poster { width: 300px; height: 450px; flex-shrink: 0; border-radius: 8px; box-shadow: 0 10px 30px rgba(0,0,0,0.5); object-fit: cover; }
+  .detail-info { flex-grow: 1; max-width: 65%; }
+  .detail-title { font-family: 'Bebas Neue', sans-serif; font-size: 4.5rem; font-weight: 700; line-height: 1.1; margin-bottom: 20px; }
+  .detail-meta { display: flex; flex-wrap: wrap; gap: 20px; margin-bottom: 25px; font-size: 1rem; color: var(--text-dark); }
+  .detail-meta span { font-weight: 700; color: var(--text-light); }
+  .detail-overview { font-size: 1.1rem; line-height: 1.6; margin-bottom: 30px; }
+  .action-btn { background-color: var(--netflix-red); color: white; padding: 15px 30px; font-size: 1.2rem; font-weight: 700; border: none; border-radius: 5px; cursor: pointer; display: inline-flex; align-items: center; gap: 10px; text-decoration: none; margin-bottom: 15px; transition: all 0.2s ease; }
+  .action-btn:hover { transform: scale(1.05); background-color: #f61f29; }
+  .section-title { font-size: 1.5rem; font-weight: 700; margin-bottom: 20px; padding-bottom: 5px; border-bottom: 2px solid var(--netflix-red); display: inline-block; }
+  .video-container { position: relative; padding-bottom: 56.25%; height: 0; overflow: hidden; max-width: 100%; background: #000; border-radius: 8px; }
+  .video-container iframe { position: absolute; top: 0; left: 0; width: 100%; height: 100%; }
+  .download-section, .episode-section { margin-top: 30px; }
+  .download-button, .episode-button { display: inline-block; padding: 12px 25px; background-color: #444; color: white; text-decoration: none; border-radius: 4px; font-weight: 700; transition: background-color 0.3s ease; margin-right: 10px; margin-bottom: 10px; text-align: center; vertical-align: middle; }
+  .copy-button { background-color: #555; color: white; border: none; padding: 8px 15px; font-size: 0.9rem; cursor: pointer; border-radius: 4px; margin-left: -5px; margin-bottom: 10px; vertical-align: middle; }
+  .episode-item { display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; padding: 15px; border-radius: 5px; background-color: #1a1a1a; border-left: 4px solid var(--netflix-red); }
+  .episode-title { font-size: 1.1rem; font-weight: 500; color: #fff; }
+  .season-tabs { display: flex; flex-wrap: wrap; gap: 10px; margin-bottom: 20px; }
+  .season-tab { padding: 8px 18px; border-radius: 50px; background-color: #333; color: var(--text-light); text-decoration: none; font-weight: 500; }
+  .season-tab.active { background-color: var(--netflix-red); }
+  .ad-container { margin: 30px 0; text-align: center; }
+  .related-section-container { padding: 40px 0; background-color: #181818; }
+  .related-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 20px 15px; padding: 0 50px; }
+  .movie-card { width: 100%; border-radius: 4px; overflow: hidden; cursor: pointer; transition: transform 0.3s ease; display: block; position: relative; }
+  .movie-poster { width: 100%; aspect-ratio: 2 / 3; object-fit: cover; display: block; }
+  .poster-badge { position: absolute; top: 10px; left: 10px; background-color: var(--netflix-red); color: white; padding: 5px 10px; font-size: 12px; font-weight: 700; border-radius: 4px; z-index: 3; }
+  @keyframes rgb-glow { 0% { box-shadow: 0 0 12px #e50914, 0 0 4px #e50914; } 33% { box-shadow: 0 0 12px #4158D0, 0 0 4px #4158D0; } 66% { box-shadow: 0 0 12px #C850C0, 0 0 4px #C850C0; } 100% { box-shadow: 0 0 12px #e50914, 0 0 4px #e50914; } }
+  @media (hover: hover) { .movie-card:hover { transform: scale(1.05); z-index: 5; animation: rgb-glow 2.5s infinite linear; } }
+  @media (max-width: 992px) { .detail-content-wrapper { flex-direction: column; align-items: center; text-align: center; } .detail-info { max-width: 100%; } .detail-title { font-size: 3.5rem; } }
+  @media (max-width: 768px) { .detail-header { padding: 20px; } .detail-hero { padding: 80px 20px 40px; } .detail-poster { width: 60%; max-width: 220px; height: auto; } .detail-title { font-size: 2.2rem; }
+  .action-btn, .download-button { display: block; width: 100%; max-width: 320px; margin: 0 auto 10px auto; }
+  .episode-item { flex-direction: column; align-items: flex-start; gap: 10px; } .episode-button { width: 100%; }
+  .section-title { margin-left: 15px !important; } .related-section-container { padding: 20px 0; }
+  .related-grid { grid-template-columns: repeat(auto-fill, minmax(110px, 1fr)); gap: 15px 10px; padding: 0 15px; } }
+"""
+
+detail_js = """
+function copyToClipboard(text) { navigator.clipboard.writeText(text).then(() => alert('Link copied!'), () => alert('Copy failed!')); }
+"""
+
+admin_js = """
+    function confirmDelete(id, title) { if (confirm('Delete "' + title + '"?')) window.location.href = '/delete_movie/' + id; }
+    function toggleFields() { var isSeries = document.getElementById('content_type').value === 'series'; document.getElementById('episode_fields').style.display = isSeries ? 'block' : 'none'; document.getElementById('movie_fields').style.display = isSeries ? 'none' : 'block'; }
+    
+    function addTelegramFileField() {
+        const c = document.getElementById('telegram_files_container');
+        const d = document.createElement('div');
+        d.className = 'dynamic-item';
+        d.innerHTML = `<div class="form-group"><label>Quality (e.g., 720p):</label><input type="text" name="telegram_quality[]" required /></div>
+                       <div class="form-group"><label>Message ID:</label><input type="number" name="telegram_message_id[]" required /></div>
+                       <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove</button>`;
+        c.appendChild(d);
+    }
+
+    function addEpisodeField() {
+        const c = document.getElementById('episodes_container');
+        const d = document.createElement('div');
+        d.className = 'dynamic-item';
+        d.innerHTML = `<div class="form-group"><label>Season Number:</label><input type="number" name="episode_season[]" value="1" required /></div>
+                       <div class="form-group"><label>Episode Number:</label><input type="number" name="episode_number[]" required /></div>
+                       <div class="form-group"><label>Episode Title:</label><input type="text" name="episode_title[]" /></div>
+                       <hr><p><b>Provide ONE of the following:</b></p>
+                       <div class="form-group"><label>Telegram Message ID:</label><input type="number" name="episode_message_id[]" /></div>
+                       <p><b>OR</b> Watch Link:</p>
+                       <div class="form-group"><label>Watch Link (Embed):</label><input type="url" name="episode_watch_link[]" /></div>
+                       <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove Episode</button>`;
+        c.appendChild(d);
+    }
+
+    document.addEventListener('DOMContentLoaded', toggleFields);
+"""
+
+
+# ======================================================================
+# --- HTML টেমপ্লেট ---
+# ======================================================================
+index_html = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8" />
+<meta name="viewport" content="width=device-width, initial-scale=1.0, user-scalable=no" />
+<title>movieflix9u - Your Entertainment Hub</title>
+<link rel="stylesheet" href="{{ asset_url('site.css') }}">
+<link rel="alternate" type="application/rss+xml" title="movieflix9u" href="{{ url_for('rss_feed') }}">
 <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.2.0/css/all.min.css">
 </head>
 <body>
@@ -196,7 +680,7 @@ index_html = """
   {% macro render_movie_card(m) %}
     <a href="{{ url_for('movie_detail', movie_id=m._id) }}" class="movie-card">
       {% if m.poster_badge %}<div class="poster-badge">{{ m.poster_badge }}</div>{% endif %}
-      <img class="movie-poster" loading="lazy" src="{{ m.poster or 'https://via.placeholder.com/400x600.png?text=No+Image' }}" alt="{{ m.title }}">
+      <img class="movie-poster" loading="lazy" src="{{ m.poster|poster_url('w342') }}" srcset="{{ m.poster|poster_srcset }}" sizes="(max-width: 768px) 110px, 200px" alt="{{ m.title }}">
       <div class="card-info-overlay"><h4 class="card-info-title">{{ m.title }}</h4></div>
     </a>
   {% endmacro %}
@@ -217,7 +701,7 @@ index_html = """
   {% else %}
     {% if all_badges %}<div class="tags-section"><div class="tags-container">{% for badge in all_badges %}<a href="{{ url_for('movies_by_badge', badge_name=badge) }}" class="tag-link">{{ badge }}</a>{% endfor %}</div></div>{% endif %}
     
-    {% if recently_added %}<div class="hero-section">{% for movie in recently_added %}<div class="hero-slide {% if loop.first %}active{% endif %}" style="background-image: url('{{ movie.poster or '' }}');"><div class="hero-content"><h1 class="hero-title">{{ movie.title }}</h1><p class="hero-overview">{{ movie.overview }}</p><div class="hero-buttons">{% if movie.watch_link and not movie.is_coming_soon %}<a href="{{ url_for('watch_movie', movie_id=movie._id) }}" class="btn btn-primary"><i class="fas fa-play"></i> Watch Now</a>{% endif %}<a href="{{ url_for('movie_detail', movie_id=movie._id) }}" class="btn btn-secondary"><i class="fas fa-info-circle"></i> More Info</a></div></div></div>{% endfor %}</div>{% endif %}
+    {% if recently_added %}<div class="hero-section">{% for movie in recently_added %}<div class="hero-slide {% if loop.first %}active{% endif %}" style="background-image: url('{{ movie.poster|poster_url('w500') if movie.poster else '' }}');"><div class="hero-content"><h1 class="hero-title">{{ movie.title }}</h1><p class="hero-overview">{{ movie.overview }}</p><div class="hero-buttons">{% if movie.watch_link and not movie.is_coming_soon %}<a href="{{ url_for('watch_movie', movie_id=movie._id) }}" class="btn btn-primary"><i class="fas fa-play"></i> Watch Now</a>{% endif %}<a href="{{ url_for('movie_detail', movie_id=movie._id) }}" class="btn btn-secondary"><i class="fas fa-info-circle"></i> More Info</a></div></div></div>{% endfor %}</div>{% endif %}
 
     {% macro render_grid_section(title, movies_list, endpoint) %}
         {% if movies_list %}
@@ -252,11 +736,7 @@ index_html = """
   {% endif %}
 </main>
 <nav class="bottom-nav"><a href="{{ url_for('home') }}" class="nav-item {% if request.endpoint == 'home' %}active{% endif %}"><i class="fas fa-home"></i><span>Home</span></a><a href="{{ url_for('genres_page') }}" class="nav-item {% if request.endpoint == 'genres_page' %}active{% endif %}"><i class="fas fa-layer-group"></i><span>Genres</span></a><a href="{{ url_for('contact') }}" class="nav-item {% if request.endpoint == 'contact' %}active{% endif %}"><i class="fas fa-envelope"></i><span>Request</span></a></nav>
-<script>
-    const nav = document.querySelector('.main-nav');
-    window.addEventListener('scroll', () => { window.scrollY > 50 ? nav.classList.add('scrolled') : nav.classList.remove('scrolled'); });
-    document.addEventListener('DOMContentLoaded', function() { const slides = document.querySelectorAll('.hero-slide'); if (slides.length > 1) { let currentSlide = 0; const showSlide = (index) => slides.forEach((s, i) => s.classList.toggle('active', i === index)); setInterval(() => { currentSlide = (currentSlide + 1) % slides.length; showSlide(currentSlide); }, 5000); } });
-</script>
+<script src="{{ asset_url('site.js') }}" defer></script>
 {% if ad_settings.popunder_code %}{{ ad_settings.popunder_code|safe }}{% endif %}
 {% if ad_settings.social_bar_code %}{{ ad_settings.social_bar_code|safe }}{% endif %}
 </body>
@@ -270,58 +750,16 @@ detail_html = """
 <meta charset="UTF-8" />
 <meta name="viewport" content="width=device-width, initial-scale=1.0, user-scalable=no" />
 <title>{{ movie.title if movie else "Content Not Found" }} - movieflix9u</title>
-<style>
-  @import url('https://fonts.googleapis.com/css2?family=Bebas+Neue&family=Roboto:wght@400;500;700&display=swap');
-  :root { --netflix-red: #E50914; --netflix-black: #141414; --text-light: #f5f5f5; --text-dark: #a0a0a0; }
-  * { box-sizing: border-box; margin: 0; padding: 0; }
-  body { font-family: 'Roboto', sans-serif; background: var(--netflix-black); color: var(--text-light); }
-  .detail-header { position: absolute; top: 0; left: 0; right: 0; padding: 20px 50px; z-index: 100; }
-  .back-button { color: var(--text-light); font-size: 1.2rem; font-weight: 700; text-decoration: none; display: flex; align-items: center; gap: 10px; transition: color 0.3s ease; }
-  .back-button:hover { color: var(--netflix-red); }
-  .detail-hero { position: relative; width: 100%; display: flex; align-items: center; justify-content: center; padding: 100px 0; }
-  .detail-hero-background { position: absolute; top: 0; left: 0; right: 0; bottom: 0; background-size: cover; background-position: center; filter: blur(20px) brightness(0.4); transform: scale(1.1); }
-  .detail-hero::after { content: ''; position: absolute; top: 0; left: 0; right: 0; bottom: 0; background: linear-gradient(to top, rgba(20,20,20,1) 0%, rgba(20,20,20,0.6) 50%, rgba(20,20,20,1) 100%); }
-  .detail-content-wrapper { position: relative; z-index: 2; display: flex; gap: 40px; max-width: 1200px; padding: 0 50px; width: 100%; }
-  .detail-poster { width: 300px; height: 450px; flex-shrink: 0; border-radius: 8px; box-shadow: 0 10px 30px rgba(0,0,0,0.5); object-fit: cover; }
-  .detail-info { flex-grow: 1; max-width: 65%; }
-  .detail-title { font-family: 'Bebas Neue', sans-serif; font-size: 4.5rem; font-weight: 700; line-height: 1.1; margin-bottom: 20px; }
-  .detail-meta { display: flex; flex-wrap: wrap; gap: 20px; margin-bottom: 25px; font-size: 1rem; color: var(--text-dark); }
-  .detail-meta span { font-weight: 700; color: var(--text-light); }
-  .detail-overview { font-size: 1.1rem; line-height: 1.6; margin-bottom: 30px; }
-  .action-btn { background-color: var(--netflix-red); color: white; padding: 15px 30px; font-size: 1.2rem; font-weight: 700; border: none; border-radius: 5px; cursor: pointer; display: inline-flex; align-items: center; gap: 10px; text-decoration: none; margin-bottom: 15px; transition: all 0.2s ease; }
-  .action-btn:hover { transform: scale(1.05); background-color: #f61f29; }
-  .section-title { font-size: 1.5rem; font-weight: 700; margin-bottom: 20px; padding-bottom: 5px; border-bottom: 2px solid var(--netflix-red); display: inline-block; }
-  .video-container { position: relative; padding-bottom: 56.25%; height: 0; overflow: hidden; max-width: 100%; background: #000; border-radius: 8px; }
-  .video-container iframe { position: absolute; top: 0; left: 0; width: 100%; height: 100%; }
-  .download-section, .episode-section { margin-top: 30px; }
-  .download-button, .episode-button { display: inline-block; padding: 12px 25px; background-color: #444; color: white; text-decoration: none; border-radius: 4px; font-weight: 700; transition: background-color 0.3s ease; margin-right: 10px; margin-bottom: 10px; text-align: center; vertical-align: middle; }
-  .copy-button { background-color: #555; color: white; border: none; padding: 8px 15px; font-size: 0.9rem; cursor: pointer; border-radius: 4px; margin-left: -5px; margin-bottom: 10px; vertical-align: middle; }
-  .episode-item { display: flex; justify-content: space-between; align-items: center; margin-bottom: 15px; padding: 15px; border-radius: 5px; background-color: #1a1a1a; border-left: 4px solid var(--netflix-red); }
-  .episode-title { font-size: 1.1rem; font-weight: 500; color: #fff; }
-  .ad-container { margin: 30px 0; text-align: center; }
-  .related-section-container { padding: 40px 0; background-color: #181818; }
-  .related-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 20px 15px; padding: 0 50px; }
-  .movie-card { width: 100%; border-radius: 4px; overflow: hidden; cursor: pointer; transition: transform 0.3s ease; display: block; position: relative; }
-  .movie-poster { width: 100%; aspect-ratio: 2 / 3; object-fit: cover; display: block; }
-  .poster-badge { position: absolute; top: 10px; left: 10px; background-color: var(--netflix-red); color: white; padding: 5px 10px; font-size: 12px; font-weight: 700; border-radius: 4px; z-index: 3; }
-  @keyframes rgb-glow { 0% { box-shadow: 0 0 12px #e50914, 0 0 4px #e50914; } 33% { box-shadow: 0 0 12px #4158D0, 0 0 4px #4158D0; } 66% { box-shadow: 0 0 12px #C850C0, 0 0 4px #C850C0; } 100% { box-shadow: 0 0 12px #e50914, 0 0 4px #e50914; } }
-  @media (hover: hover) { .movie-card:hover { transform: scale(1.05); z-index: 5; animation: rgb-glow 2.5s infinite linear; } }
-  @media (max-width: 992px) { .detail-content-wrapper { flex-direction: column; align-items: center; text-align: center; } .detail-info { max-width: 100%; } .detail-title { font-size: 3.5rem; } }
-  @media (max-width: 768px) { .detail-header { padding: 20px; } .detail-hero { padding: 80px 20px 40px; } .detail-poster { width: 60%; max-width: 220px; height: auto; } .detail-title { font-size: 2.2rem; }
-  .action-btn, .download-button { display: block; width: 100%; max-width: 320px; margin: 0 auto 10px auto; }
-  .episode-item { flex-direction: column; align-items: flex-start; gap: 10px; } .episode-button { width: 100%; }
-  .section-title { margin-left: 15px !important; } .related-section-container { padding: 20px 0; }
-  .related-grid { grid-template-columns: repeat(auto-fill, minmax(110px, 1fr)); gap: 15px 10px; padding: 0 15px; } }
-</style>
+<link rel="stylesheet" href="{{ asset_url('detail.css') }}">
 <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.2.0/css/all.min.css">
 </head>
 <body>
-{% macro render_movie_card(m) %}<a href="{{ url_for('movie_detail', movie_id=m._id) }}" class="movie-card">{% if m.poster_badge %}<div class="poster-badge">{{ m.poster_badge }}</div>{% endif %}<img class="movie-poster" loading="lazy" src="{{ m.poster or 'https://via.placeholder.com/400x600.png?text=No+Image' }}" alt="{{ m.title }}"></a>{% endmacro %}
+{% macro render_movie_card(m) %}<a href="{{ url_for('movie_detail', movie_id=m._id) }}" class="movie-card">{% if m.poster_badge %}<div class="poster-badge">{{ m.poster_badge }}</div>{% endif %}<img class="movie-poster" loading="lazy" src="{{ m.poster|poster_url('w342') }}" srcset="{{ m.poster|poster_srcset }}" sizes="(max-width: 768px) 110px, 200px" alt="{{ m.title }}"></a>{% endmacro %}
 <header class="detail-header"><a href="{{ url_for('home') }}" class="back-button"><i class="fas fa-arrow-left"></i> Back to Home</a></header>
 {% if movie %}
 <div class="detail-hero" style="min-height: auto; padding-bottom: 60px;">
-  <div class="detail-hero-background" style="background-image: url('{{ movie.poster }}');"></div>
-  <div class="detail-content-wrapper"><img class="detail-poster" src="{{ movie.poster or 'https://via.placeholder.com/400x600.png?text=No+Image' }}" alt="{{ movie.title }}">
+  <div class="detail-hero-background" style="background-image: url('{{ movie.poster|poster_url('w185') }}');"></div>
+  <div class="detail-content-wrapper"><img class="detail-poster" src="{{ movie.poster|poster_url('w342') }}" srcset="{{ movie.poster|poster_srcset }}" sizes="(max-width: 768px) 220px, 300px" alt="{{ movie.title }}">
     <div class="detail-info">
       <h1 class="detail-title">{{ movie.title }}</h1>
       <div class="detail-meta">{% if movie.release_date %}<span>{{ movie.release_date.split('-')[0] }}</span>{% endif %}{% if movie.vote_average %}<span><i class="fas fa-star" style="color:#f5c518;"></i> {{ "%.1f"|format(movie.vote_average) }}</span>{% endif %}{% if movie.genres %}<span>{{ movie.genres | join(' • ') }}</span>{% endif %}</div>
@@ -334,12 +772,15 @@ detail_html = """
       {% elif movie.type == 'movie' %}
         <div class="download-section">
           {% if movie.links %}<h3 class="section-title">Download Links</h3>{% for link_item in movie.links %}<div><a class="download-button" href="{{ link_item.url }}" target="_blank" rel="noopener"><i class="fas fa-download"></i> {{ link_item.quality }}</a><button class="copy-button" onclick="copyToClipboard('{{ link_item.url }}')"><i class="fas fa-copy"></i></button></div>{% endfor %}{% endif %}
-          {% if movie.files %}<h3 class="section-title">Get from Telegram</h3>{% for file in movie.files | sort(attribute='quality') %}<a href="https://t.me/{{ bot_username }}?start={{ movie._id }}_{{ file.quality }}" class="action-btn" style="background-color: #2AABEE; display: block; text-align:center; margin-top:10px; margin-bottom: 0;"><i class="fa-brands fa-telegram"></i> Get {{ file.quality }}</a>{% endfor %}{% endif %}
+          {% set live_files = (movie.files or []) | rejectattr('broken') | list %}{% if live_files %}<h3 class="section-title">Get from Telegram</h3>{% for file in live_files | sort(attribute='quality') %}<a href="https://t.me/{{ bot_username }}?start={{ movie._id }}_{{ file.quality }}" class="action-btn" style="background-color: #2AABEE; display: block; text-align:center; margin-top:10px; margin-bottom: 0;"><i class="fa-brands fa-telegram"></i> Get {{ file.quality }}</a>{% endfor %}{% endif %}
         </div>
       {% elif movie.type == 'series' %}
         <div class="episode-section">
           <h3 class="section-title">Episodes</h3>
-          {% if movie.episodes %}{% for ep in movie.episodes | sort(attribute='episode_number') | sort(attribute='season') %}<div class="episode-item"><span class="episode-title">Season {{ ep.season }} - Episode {{ ep.episode_number }}</span><a href="https://t.me/{{ bot_username }}?start={{ movie._id }}_{{ ep.season }}_{{ ep.episode_number }}" class="episode-button" style="background-color: #2AABEE;"><i class="fa-brands fa-telegram"></i> Get Episode</a></div>{% endfor %}{% else %}<p>No episodes available yet.</p>{% endif %}
+          {% if episode_page.seasons|length > 1 %}<div class="season-tabs">{% for s in episode_page.seasons %}<a href="{{ url_for('movie_detail', movie_id=movie._id, season=s) }}" class="season-tab {% if s == episode_page.season %}active{% endif %}">Season {{ s }}</a>{% endfor %}</div>{% endif %}
+          {% if episode_page.episodes %}{% for ep in episode_page.episodes %}<div class="episode-item"><span class="episode-title">Season {{ ep.season }} - Episode {{ ep.episode_number }}</span>{% if not ep.broken %}<a href="https://t.me/{{ bot_username }}?start={{ movie._id }}_{{ ep.season }}_{{ ep.episode_number }}" class="episode-button" style="background-color: #2AABEE;"><i class="fa-brands fa-telegram"></i> Get Episode</a>{% endif %}</div>{% endfor %}
+          <div class="episode-pager">{% if episode_page.page > 1 %}<a href="{{ url_for('movie_detail', movie_id=movie._id, season=episode_page.season, page=episode_page.page - 1) }}" class="download-button">&laquo; Previous</a>{% endif %}{% if episode_page.has_more %}<a href="{{ url_for('movie_detail', movie_id=movie._id, season=episode_page.season, page=episode_page.page + 1) }}" class="download-button">More Episodes &raquo;</a>{% endif %}</div>
+          {% else %}<p>No episodes available yet.</p>{% endif %}
         </div>
       {% endif %}
     </div>
@@ -347,9 +788,7 @@ detail_html = """
 </div>
 {% if related_movies %}<div class="related-section-container"><h3 class="section-title" style="margin-left: 50px; color: white;">You Might Also Like</h3><div class="related-grid">{% for m in related_movies %}{{ render_movie_card(m) }}{% endfor %}</div></div>{% endif %}
 {% else %}<div style="display:flex; justify-content:center; align-items:center; height:100vh;"><h2>Content not found.</h2></div>{% endif %}
-<script>
-function copyToClipboard(text) { navigator.clipboard.writeText(text).then(() => alert('Link copied!'), () => alert('Copy failed!')); }
-</script>
+<script src="{{ asset_url('detail.js') }}" defer></script>
 {% if ad_settings.popunder_code %}{{ ad_settings.popunder_code|safe }}{% endif %}
 {% if ad_settings.social_bar_code %}{{ ad_settings.social_bar_code|safe }}{% endif %}
 </body>
@@ -434,42 +873,16 @@ hr.section-divider { border: 0; height: 2px; background-color: var(--light-gray)
   </form>
   <hr class="section-divider">
   <h2>Manage Content</h2>
-  <table><thead><tr><th>Title</th><th>Type</th><th>Actions</th></tr></thead><tbody>{% for movie in all_content %}<tr><td>{{ movie.title }}</td><td>{{ movie.type | title }}</td><td class="action-buttons"><a href="{{ url_for('edit_movie', movie_id=movie._id) }}" class="edit-btn">Edit</a><button class="delete-btn" onclick="confirmDelete('{{ movie._id }}', '{{ movie.title }}')">Delete</button></td></tr>{% endfor %}</tbody></table>
+  <form id="bulk_select" method="get" action="{{ url_for('bulk_operations') }}" style="max-width: none; margin: 0; padding: 0; background: none;"><button type="submit" class="add-btn">Bulk Edit Selected</button> <a href="{{ url_for('bulk_operations') }}" class="add-btn" style="text-decoration: none; display: inline-block;">Bulk Operations</a></form>
+  <table><thead><tr><th></th><th>Title</th><th>Type</th><th>Actions</th></tr></thead><tbody>{% for movie in all_content %}<tr><td><input type="checkbox" name="ids" value="{{ movie._id }}" form="bulk_select"></td><td>{{ movie.title }}</td><td>{{ movie.type | title }}</td><td class="action-buttons"><a href="{{ url_for('edit_movie', movie_id=movie._id) }}" class="edit-btn">Edit</a><button class="delete-btn" onclick="confirmDelete('{{ movie._id }}', '{{ movie.title }}')">Delete</button></td></tr>{% endfor %}</tbody></table>
+  <hr class="section-divider">
+  <h2>Broken Telegram Files</h2>
+  {% if broken_refs %}<p>These files were deleted from the channel. Their buttons are hidden until you upload them again.</p><table><thead><tr><th>Since</th><th>Title</th><th>File</th><th>Message ID</th><th>Action</th></tr></thead><tbody>{% for ref in broken_refs %}<tr><td style="min-width: 150px;">{{ ref.broken_at.strftime('%Y-%m-%d %H:%M') if ref.broken_at else 'N/A' }}</td><td>{{ ref.title or 'N/A' }}</td><td>{{ ref.item }}</td><td>{{ ref.message_id }}</td><td><a href="{{ url_for('edit_movie', movie_id=ref.title_id) }}" class="edit-btn">Edit</a></td></tr>{% endfor %}</tbody></table>{% else %}<p>No broken files found.</p>{% endif %}
   <hr class="section-divider">
   <h2>User Feedback / Reports</h2>
   {% if feedback_list %}<table><thead><tr><th>Date</th><th>Type</th><th>Title</th><th>Message</th><th>Email</th><th>Action</th></tr></thead><tbody>{% for item in feedback_list %}<tr><td style="min-width: 150px;">{{ item.timestamp.strftime('%Y-%m-%d %H:%M') }}</td><td>{{ item.type }}</td><td>{{ item.content_title }}</td><td style="white-space: pre-wrap; min-width: 300px;">{{ item.message }}</td><td>{{ item.email or 'N/A' }}</td><td><a href="{{ url_for('delete_feedback', feedback_id=item._id) }}" class="delete-btn" onclick="return confirm('Delete this feedback?');">Delete</a></td></tr>{% endfor %}</tbody></table>{% else %}<p>No new feedback or reports.</p>{% endif %}
   
-  <script>
-    function confirmDelete(id, title) { if (confirm('Delete "' + title + '"?')) window.location.href = '/delete_movie/' + id; }
-    function toggleFields() { var isSeries = document.getElementById('content_type').value === 'series'; document.getElementById('episode_fields').style.display = isSeries ? 'block' : 'none'; document.getElementById('movie_fields').style.display = isSeries ? 'none' : 'block'; }
-    
-    function addTelegramFileField() {
-        const c = document.getElementById('telegram_files_container');
-        const d = document.createElement('div');
-        d.className = 'dynamic-item';
-        d.innerHTML = `<div class="form-group"><label>Quality (e.g., 720p):</label><input type="text" name="telegram_quality[]" required /></div>
-                       <div class="form-group"><label>Message ID:</label><input type="number" name="telegram_message_id[]" required /></div>
-                       <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove</button>`;
-        c.appendChild(d);
-    }
-
-    function addEpisodeField() {
-        const c = document.getElementById('episodes_container');
-        const d = document.createElement('div');
-        d.className = 'dynamic-item';
-        d.innerHTML = `<div class="form-group"><label>Season Number:</label><input type="number" name="episode_season[]" value="1" required /></div>
-                       <div class="form-group"><label>Episode Number:</label><input type="number" name="episode_number[]" required /></div>
-                       <div class="form-group"><label>Episode Title:</label><input type="text" name="episode_title[]" /></div>
-                       <hr><p><b>Provide ONE of the following:</b></p>
-                       <div class="form-group"><label>Telegram Message ID:</label><input type="number" name="episode_message_id[]" /></div>
-                       <p><b>OR</b> Watch Link:</p>
-                       <div class="form-group"><label>Watch Link (Embed):</label><input type="url" name="episode_watch_link[]" /></div>
-                       <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove Episode</button>`;
-        c.appendChild(d);
-    }
-
-    document.addEventListener('DOMContentLoaded', toggleFields);
-  </script>
+  <script src="{{ asset_url('admin.js') }}"></script>
 </body></html>
 """
 
@@ -507,7 +920,7 @@ button[type="submit"], .add-btn { background: var(--netflix-red); color: white;
             {% if movie.type == 'movie' and movie.files %}{% for file in movie.files %}
             <div class="dynamic-item">
                 <div class="form-group"><label>Quality:</label><input type="text" name="telegram_quality[]" value="{{ file.quality }}" required /></div>
-                <div class="form-group"><label>Message ID:</label><input type="number" name="telegram_message_id[]" value="{{ file.message_id }}" required /></div>
+                <div class="form-group"><label>Message ID:</label><input type="number" name="telegram_message_id[]" value="{{ file.message_id }}" required />{% if file.broken %}<small style="color: var(--netflix-red);">File missing from channel. Re-upload and update the ID.</small>{% endif %}</div>
                 <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove</button>
             </div>
             {% endfor %}{% endif %}
@@ -516,12 +929,12 @@ button[type="submit"], .add-btn { background: var(--netflix-red); color: white;
 
     <div id="episode_fields" style="display: none;">
       <h3>Episodes</h3><div id="episodes_container">
-      {% if movie.type == 'series' and movie.episodes %}{% for ep in movie.episodes | sort(attribute='episode_number') | sort(attribute='season') %}<div class="dynamic-item">
+      {% if movie.type == 'series' and episodes %}{% for ep in episodes %}<div class="dynamic-item">
         <div class="form-group"><label>Season Number:</label><input type="number" name="episode_season[]" value="{{ ep.season or 1 }}" required /></div>
         <div class="form-group"><label>Ep Number:</label><input type="number" name="episode_number[]" value="{{ ep.episode_number }}" required /></div>
         <div class="form-group"><label>Ep Title:</label><input type="text" name="episode_title[]" value="{{ ep.title or '' }}" /></div>
         <hr><p><b>Provide ONE of the following:</b></p>
-        <div class="form-group"><label>Telegram Message ID:</label><input type="number" name="episode_message_id[]" value="{{ ep.message_id or '' }}" /></div>
+        <div class="form-group"><label>Telegram Message ID:</label><input type="number" name="episode_message_id[]" value="{{ ep.message_id or '' }}" />{% if ep.broken %}<small style="color: var(--netflix-red);">File missing from channel. Re-upload and update the ID.</small>{% endif %}</div>
         <p><b>OR</b> Watch Link:</p>
         <div class="form-group"><label>Watch Link (Embed):</label><input type="url" name="episode_watch_link[]" value="{{ ep.watch_link or '' }}" /></div>
         <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove Episode</button>
@@ -529,40 +942,63 @@ button[type="submit"], .add-btn { background: var(--netflix-red); color: white;
     </div>
     
     <hr style="margin: 20px 0;">
-    <div class="form-group"><input type="checkbox" name="is_trending" value="true" {% if movie.is_trending %}checked{% endif %}><label style="display: inline-block;">Is Trending?</label></div>
+    <div class="form-group"><input type="checkbox" name="trending_pinned" value="true" {% if movie.trending_pinned %}checked{% endif %}><label style="display: inline-block;">Pin to Trending? {% if movie.is_trending and not movie.trending_pinned and movie.trending_score %}(currently trending from views/downloads){% elif movie.is_trending and not movie.trending_pinned %}(currently trending; leave unchecked to remove){% endif %}</label></div>
     <div class="form-group"><input type="checkbox" name="is_coming_soon" value="true" {% if movie.is_coming_soon %}checked{% endif %}><label style="display: inline-block;">Is Coming Soon?</label></div>
     <button type="submit">Update Content</button>
   </form>
   
-  <script>
-    function toggleFields() { var isSeries = document.getElementById('content_type').value === 'series'; document.getElementById('episode_fields').style.display = isSeries ? 'block' : 'none'; document.getElementById('movie_fields').style.display = isSeries ? 'none' : 'block'; }
-    
-    function addTelegramFileField() {
-        const c = document.getElementById('telegram_files_container');
-        const d = document.createElement('div');
-        d.className = 'dynamic-item';
-        d.innerHTML = `<div class="form-group"><label>Quality (e.g., 720p):</label><input type="text" name="telegram_quality[]" required /></div>
-                       <div class="form-group"><label>Message ID:</label><input type="number" name="telegram_message_id[]" required /></div>
-                       <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove</button>`;
-        c.appendChild(d);
-    }
+  <script src="{{ asset_url('admin.js') }}"></script>
+</body></html>
+"""
 
-    function addEpisodeField() {
-        const c = document.getElementById('episodes_container');
-        const d = document.createElement('div');
-        d.className = 'dynamic-item';
-        d.innerHTML = `<div class="form-group"><label>Season Number:</label><input type="number" name="episode_season[]" value="1" required /></div>
-                       <div class="form-group"><label>Episode Number:</label><input type="number" name="episode_number[]" required /></div>
-                       <div class="form-group"><label>Episode Title:</label><input type="text" name="episode_title[]" /></div>
-                       <hr><p><b>Provide ONE of the following:</b></p>
-                       <div class="form-group"><label>Telegram Message ID:</label><input type="number" name="episode_message_id[]" /></div>
-                       <p><b>OR</b> Watch Link:</p>
-                       <div class="form-group"><label>Watch Link (Embed):</label><input type="url" name="episode_watch_link[]" /></div>
-                       <button type="button" onclick="this.parentElement.remove()" class="delete-btn">Remove Episode</button>`;
-        c.appendChild(d);
-    }
-    document.addEventListener('DOMContentLoaded', toggleFields);
-  </script>
+bulk_html = """
+<!DOCTYPE html>
+<html><head><title>Bulk Operations - movieflix9u</title><meta name="viewport" content="width=device-width, initial-scale=1" />{% if job and job.status in ('queued', 'running') %}<meta http-equiv="refresh" content="2">{% endif %}<style>
+:root { --netflix-red: #E50914; --netflix-black: #141414; --dark-gray: #222; --light-gray: #333; --text-light: #f5f5f5; }
+body { font-family: 'Roboto', sans-serif; background: var(--netflix-black); color: var(--text-light); padding: 20px; }
+h2, h3 { font-family: 'Bebas Neue', sans-serif; color: var(--netflix-red); } h2 { font-size: 2.5rem; margin-bottom: 20px; } h3 { font-size: 1.5rem; margin: 20px 0 10px 0;}
+form, .job-box { max-width: 800px; margin: 0 auto 40px auto; background: var(--dark-gray); padding: 25px; border-radius: 8px;}
+.form-group { margin-bottom: 15px; } .form-group label { display: block; margin-bottom: 8px; font-weight: bold; }
+input, textarea, select { width: 100%; padding: 12px; border-radius: 4px; border: 1px solid var(--light-gray); font-size: 1rem; background: var(--light-gray); color: var(--text-light); box-sizing: border-box; }
+input[type="checkbox"] { width: auto; margin-right: 10px; transform: scale(1.2); } textarea { resize: vertical; min-height: 80px; }
+button[type="submit"] { background: var(--netflix-red); color: white; font-weight: 700; cursor: pointer; border: none; padding: 12px 25px; border-radius: 4px; font-size: 1rem; margin-right: 10px; }
+button[name="dry_run"] { background: #555; }
+.back-to-admin { display: inline-block; margin-bottom: 20px; color: var(--netflix-red); text-decoration: none; font-weight: bold; }
+.notice { padding: 15px; border-radius: 5px; margin-bottom: 20px; background: #1f4e2c; color: #d4edda; } .notice.error { background: #5a1a1a; color: #f8d7da; }
+.progress { height: 20px; background: var(--light-gray); border-radius: 4px; overflow: hidden; } .progress div { height: 100%; background: var(--netflix-red); }
+</style><link href="https://fonts.googleapis.com/css2?family=Bebas+Neue&family=Roboto:wght@400;700&display=swap" rel="stylesheet"></head>
+<body>
+  <a href="{{ url_for('admin') }}" class="back-to-admin">← Back to Admin</a>
+  <h2>Bulk Operations</h2>
+  {% if job %}
+  <div class="job-box">
+    <h3>Job {{ job._id }} — {{ job.status }}</h3>
+    <div class="progress"><div style="width: {{ (100 * job.processed / job.total) | round | int if job.total else 100 }}%;"></div></div>
+    <p>{{ job.processed }} / {{ job.total }} titles processed · {{ job.matched | default(job.modified) }} matched · {{ job.deleted }} deleted</p>
+    {% if job.error %}<div class="notice error">{{ job.error }}</div>{% endif %}
+  </div>
+  {% else %}
+  {% if error %}<div class="notice error">{{ error }}</div>{% endif %}
+  {% if dry_run_count is not none %}<div class="notice">Dry run: {{ dry_run_count }} titles match this selection. Nothing was changed.</div>{% endif %}
+  <form method="post" action="{{ url_for('bulk_operations') }}">
+    <h3>Select Titles</h3>
+    <div class="form-group"><label>IDs (one per line or comma separated, optional):</label><textarea name="ids">{{ form.ids or '' }}</textarea></div>
+    <div class="form-group"><label>Type:</label><select name="type"><option value="">Any</option><option value="movie" {% if form.type == 'movie' %}selected{% endif %}>Movie</option><option value="series" {% if form.type == 'series' %}selected{% endif %}>TV/Web Series</option></select></div>
+    <div class="form-group"><label>Genre:</label><input type="text" name="genre" value="{{ form.genre or '' }}" /></div>
+    <div class="form-group"><label>Poster Badge:</label><input type="text" name="badge" value="{{ form.badge or '' }}" /></div>
+    <div class="form-group"><label>Title contains:</label><input type="text" name="title" value="{{ form.title or '' }}" /></div>
+    <h3>Changes</h3>
+    <div class="form-group"><label>Trending:</label><select name="trending"><option value="">No change</option><option value="set">Pin to Trending</option><option value="unset">Remove from Trending</option></select></div>
+    <div class="form-group"><label>Coming Soon:</label><select name="coming_soon"><option value="">No change</option><option value="set">Mark as Coming Soon</option><option value="unset">Unmark Coming Soon</option></select></div>
+    <div class="form-group"><label>Set Poster Badge:</label><input type="text" name="set_badge" /></div>
+    <div class="form-group"><input type="checkbox" name="unset_badge" value="true"><label style="display: inline-block;">Remove Poster Badge</label></div>
+    <div class="form-group"><label>Add Genre:</label><input type="text" name="add_genre" /></div>
+    <div class="form-group"><label>Remove Genre:</label><input type="text" name="remove_genre" /></div>
+    <div class="form-group"><label>Delete titles (type DELETE to confirm):</label><input type="text" name="delete_confirm" /></div>
+    <button type="submit" name="dry_run" value="true">Dry Run (Count)</button><button type="submit">Apply</button>
+  </form>
+  {% endif %}
+  {% if recent_jobs %}<h3>Recent Jobs</h3><ul>{% for j in recent_jobs %}<li><a href="{{ url_for('bulk_job_status', job_id=j._id) }}" style="color: var(--text-light);">{{ j.created_at.strftime('%Y-%m-%d %H:%M') }} — {{ j.status }} ({{ j.processed }}/{{ j.total }})</a></li>{% endfor %}</ul>{% endif %}
 </body></html>
 """
 
@@ -607,80 +1043,684 @@ def get_tmdb_details_from_api(title, content_type, year=None):
     if not TMDB_API_KEY: return None
     search_type = "tv" if content_type == "series" else "movie"
     try:
-        search_url = f"https://api.themoviedb.org/3/search/{search_type}?api_key={TMDB_API_KEY}&query={requests.utils.quote(title)}"
+        search_url = f"{TMDB_API_BASE}/search/{search_type}?api_key={TMDB_API_KEY}&query={requests.utils.quote(title)}"
         if year and search_type == "movie": search_url += f"&primary_release_year={year}"
         search_res = requests.get(search_url, timeout=5).json()
+        mark_dependency_ok("tmdb")
         if not search_res.get("results"): return None
 
         tmdb_id = search_res["results"][0].get("id")
-        detail_url = f"https://api.themoviedb.org/3/{search_type}/{tmdb_id}?api_key={TMDB_API_KEY}"
+        detail_url = f"{TMDB_API_BASE}/{search_type}/{tmdb_id}?api_key={TMDB_API_KEY}"
         res = requests.get(detail_url, timeout=5).json()
 
-        return {
-            "tmdb_id": tmdb_id, "title": res.get("title") if search_type == "movie" else res.get("name"),
-            "poster": f"https://image.tmdb.org/t/p/w500{res.get('poster_path')}" if res.get('poster_path') else None,
-            "overview": res.get("overview"), "release_date": res.get("release_date") if search_type == "movie" else res.get("first_air_date"),
-            "genres": [g['name'] for g in res.get("genres", [])], "vote_average": res.get("vote_average")
-        }
+        return {"tmdb_id": tmdb_id, **tmdb_fields(res, search_type)}
     except requests.RequestException as e:
         print(f"TMDb API error for '{title}': {e}")
     return None
 
+def tmdb_fields(res, search_type):
+    return {
+        "title": res.get("title") if search_type == "movie" else res.get("name"),
+        "poster": f"https://image.tmdb.org/t/p/w500{res.get('poster_path')}" if res.get('poster_path') else None,
+        "overview": res.get("overview"), "release_date": res.get("release_date") if search_type == "movie" else res.get("first_air_date"),
+        "genres": [g['name'] for g in res.get("genres", [])], "vote_average": res.get("vote_average")
+    }
+
+# --- TMDb মেটাডেটা রিফ্রেশ (শুধু /changes ফিডে আসা আইডিগুলো আবার আনা হয়) ---
+TMDB_CHANGES_MAX_DAYS = 14  # TMDb /changes একবারে সর্বোচ্চ ১৪ দিনের রেঞ্জ দেয়
+TMDB_REFRESH_FIELDS = ("title", "poster", "overview", "release_date", "genres", "vote_average")
+TMDB_RETRY_MAX = 5000
+
+def fetch_tmdb_changed_ids(search_type, start, end):
+    changed, page, total_pages = set(), 1, 1
+    while page <= total_pages:
+        res = requests.get(f"{TMDB_API_BASE}/{search_type}/changes", params={
+            "api_key": TMDB_API_KEY, "start_date": start.strftime('%Y-%m-%d'), "end_date": end.strftime('%Y-%m-%d'), "page": page,
+        }, timeout=10).json()
+        changed.update(item["id"] for item in res.get("results", []) if item.get("id"))
+        total_pages = res.get("total_pages") or 1
+        page += 1
+    return changed
+
+def fetch_tmdb_details(search_type, tmdb_id):
+    """(tmdb_id, fields) ফেরত দেয়; fields None মানে সাময়িক ব্যর্থতা (পরের রানে আবার চেষ্টা), {} মানে TMDb তে আর নেই।"""
+    try:
+        res = requests.get(f"{TMDB_API_BASE}/{search_type}/{tmdb_id}", params={"api_key": TMDB_API_KEY}, timeout=10)
+        if res.status_code == 404: return tmdb_id, {}
+        if res.status_code != 200: return tmdb_id, None
+        mark_dependency_ok("tmdb")
+        return tmdb_id, tmdb_fields(res.json(), search_type)
+    except (requests.RequestException, ValueError) as e:
+        print(f"TMDb refresh error for {search_type}/{tmdb_id}: {e}")
+        return tmdb_id, None
+
+def refresh_tmdb_metadata():
+    """শেষ রানের পর TMDb তে যেগুলো বদলেছে শুধু সেগুলো সীমিত থ্রেড পুলে এনে bulk_write দিয়ে আপডেট করা হয়।
+    অ্যাডমিন নিজে যে ফিল্ড এডিট করেছেন (edited_fields) সেগুলো বদলানো হয় না।
+    ডিটেইল আনতে ব্যর্থ আইডিগুলো meta তে থেকে যায় ও পরের রানে আবার চেষ্টা হয়; কোনো changes ফিড ব্যর্থ হলে last_run এগোয় না।"""
+    if not TMDB_API_KEY: return 0
+    now = datetime.utcnow()
+    state = meta.find_one({"_id": "tmdb_refresh"}) or {}
+    start = max(state.get("last_run") or now - timedelta(days=1), now - timedelta(days=TMDB_CHANGES_MAX_DAYS))
+    ops, changed_docs, posters = [], [], []
+    retry, feed_failed = {}, False
+    for content_type, search_type in (("movie", "movie"), ("series", "tv")):
+        pending = set((state.get("retry") or {}).get(search_type) or [])
+        try:
+            pending |= fetch_tmdb_changed_ids(search_type, start, now)
+        except (requests.RequestException, ValueError) as e:
+            print(f"TMDb changes feed error ({search_type}): {e}")
+            feed_failed = True
+        retry[search_type] = sorted(pending)  # নিচে সফল হলে বাদ যায়
+        if not pending: continue
+        docs = list(movies.find({"type": content_type, "tmdb_id": {"$in": list(pending)}}, {"tmdb_id": 1, "edited_fields": 1, "genres": 1, "poster_badge": 1}))
+        if not docs:
+            retry[search_type] = []
+            continue
+        with ThreadPoolExecutor(max_workers=TMDB_REFRESH_WORKERS) as pool:
+            details = dict(pool.map(lambda tmdb_id: fetch_tmdb_details(search_type, tmdb_id), {d["tmdb_id"] for d in docs}))
+        retry[search_type] = sorted(tmdb_id for tmdb_id, fields in details.items() if fields is None)[:TMDB_RETRY_MAX]
+        for doc in docs:
+            fields = details.get(doc["tmdb_id"])
+            if not fields: continue
+            update = {k: v for k, v in fields.items() if k in TMDB_REFRESH_FIELDS and k not in (doc.get("edited_fields") or []) and v not in (None, "", [])}
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {**update, "tmdb_refreshed_at": now}}))
+                changed_docs.append(doc)
+                posters.append(update.get("poster"))
+    if ops:
+        movies.bulk_write(ops, ordered=False)
+        publish_invalidation("catalog", movie_tags(*changed_docs) | {"genre:*"})
+        for poster in posters:
+            schedule_poster_warmup(poster)
+    progress = {"last_updated": len(ops), "retry": retry}
+    if not feed_failed: progress["last_run"] = now
+    meta.update_one({"_id": "tmdb_refresh"}, {"$set": progress}, upsert=True)
+    print(f"TMDb refresh: updated {len(ops)} titles changed since {start:%Y-%m-%d}, {sum(map(len, retry.values()))} to retry.")
+    return len(ops)
+
+# --- পোস্টার ইমেজ ক্যাশ (TMDb থেকে একবার এনে WebP থাম্বনেইল বানিয়ে ডিস্কে রাখা হয়) ---
+TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/"
+TMDB_POSTER_RE = re.compile(r'^https?://image\.tmdb\.org/t/p/[a-z0-9]+/([A-Za-z0-9_-]+\.(?:jpg|jpeg|png))$')
+POSTER_SIZES = {"w185": 185, "w342": 342, "w500": 500}
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 3600
+image_cache_lock = threading.Lock()  # শুধু নিচের ছোট স্টেটগুলোর জন্য; নেটওয়ার্ক বা এনকোডিং এর সময় ধরা থাকে না
+image_evict_lock = threading.Lock()
+poster_build_locks = {}  # tmdb_path -> [Lock, অপেক্ষমাণ থ্রেড সংখ্যা]
+POSTER_FAILURE_TTL = 600
+poster_failures = {}  # tmdb_path -> এই সময় পর্যন্ত আবার ডাউনলোডের চেষ্টা হবে না
+# এই প্রসেসের হিসাবে ক্যাশের মোট সাইজ; প্রথম বিল্ডে একবার স্ক্যান, পরে শুধু যোগ হয়
+# (অন্য ওয়ার্কারের লেখা ফাইল প্রতিবার evict_image_cache এর পূর্ণ স্ক্যানে ঠিক হয়ে যায়)
+image_cache_state = {"bytes": None}
+IMAGE_CACHE_LOW_WATERMARK = 0.9
+
+PLACEHOLDER_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="400" height="600" viewBox="0 0 400 600"><rect width="400" height="600" fill="#222"/><text x="200" y="300" fill="#777" font-family="sans-serif" font-size="28" text-anchor="middle">No Image</text></svg>"""
+
+def poster_cache_path(size, tmdb_path):
+    stem = os.path.splitext(tmdb_path)[0]
+    return os.path.join(IMAGE_CACHE_DIR, size, f"{stem}.webp")
+
+def scan_image_cache():
+    entries = []
+    for root, _, names in os.walk(IMAGE_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+def evict_image_cache():
+    """সবচেয়ে পুরনো ব্যবহৃত (LRU) ফাইলগুলো মুছে ক্যাশকে লিমিটের ৯০% এ নামানো হয়, যাতে প্রতিটি নতুন পোস্টারে আবার স্ক্যান না লাগে।"""
+    if not image_evict_lock.acquire(blocking=False): return  # অন্য থ্রেড ইতিমধ্যে মুছছে
+    try:
+        entries = scan_image_cache()
+        total = sum(size for _, size, _ in entries)
+        target = IMAGE_CACHE_MAX_MB * 1024 * 1024 * IMAGE_CACHE_LOW_WATERMARK
+        for _, size, path in sorted(entries):
+            if total <= target: break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with image_cache_lock:
+            image_cache_state["bytes"] = total
+    finally:
+        image_evict_lock.release()
+
+def record_image_cache_growth(delta):
+    if image_cache_state["bytes"] is None:
+        total = sum(size for _, size, _ in scan_image_cache())  # প্রসেসে একবারই, এতে নতুন ফাইলগুলোও আছে
+        with image_cache_lock:
+            if image_cache_state["bytes"] is None: image_cache_state["bytes"] = total - delta
+    with image_cache_lock:
+        image_cache_state["bytes"] += delta
+        over_limit = image_cache_state["bytes"] > IMAGE_CACHE_MAX_MB * 1024 * 1024
+    if over_limit: evict_image_cache()
+
+@contextmanager
+def poster_build_lock(tmdb_path):
+    """একই পোস্টার একসাথে একবারই তৈরি হয়; ভিন্ন পোস্টারগুলো একে অপরের জন্য অপেক্ষা করে না।"""
+    with image_cache_lock:
+        entry = poster_build_locks.setdefault(tmdb_path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with image_cache_lock:
+            entry[1] -= 1
+            if not entry[1]: poster_build_locks.pop(tmdb_path, None)
+
+def build_poster_variants(tmdb_path):
+    """TMDb থেকে মূল পোস্টার একবার ডাউনলোড করে সবগুলো সাইজের WebP ফাইল তৈরি করে; ক্যাশে কত বাইট বাড়ল তা ফেরত দেয়।"""
+    res = requests.get(f"{TMDB_IMAGE_BASE}w500/{tmdb_path}", timeout=10)
+    res.raise_for_status()
+    from PIL import Image  # শুধু পোস্টার তৈরির সময় লোড হয়
+    source = Image.open(io.BytesIO(res.content)).convert("RGB")
+    written = 0
+    for size, width in POSTER_SIZES.items():
+        target = poster_cache_path(size, tmdb_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        img = source
+        if source.width > width:
+            img = source.resize((width, round(source.height * width / source.width)), Image.LANCZOS)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, "WEBP", quality=80, method=4)
+        written += os.path.getsize(tmp_path)
+        try: written -= os.path.getsize(target)  # একই ফাইল বদলানো হলে
+        except OSError: pass
+        os.replace(tmp_path, target)
+    return written
+
+def get_cached_poster(size, tmdb_path):
+    path = poster_cache_path(size, tmdb_path)
+    if os.path.exists(path):
+        # LRU এর জন্য শেষ ব্যবহারের সময় আপডেট করা হয়
+        try: os.utime(path)
+        except OSError: pass
+        return path
+    failed_until = poster_failures.get(tmdb_path)
+    if failed_until and failed_until > time.time():
+        raise LookupError(f"recent fetch failure for {tmdb_path}")
+    with poster_build_lock(tmdb_path):
+        if not os.path.exists(path):
+            try:
+                record_image_cache_growth(build_poster_variants(tmdb_path))
+            except Exception:
+                # TMDb থেকে সরানো পোস্টার প্রতিটি ভিজিটে আবার আনার চেষ্টা যেন না হয়
+                with image_cache_lock:
+                    poster_failures[tmdb_path] = time.time() + POSTER_FAILURE_TTL
+                raise
+    with image_cache_lock:
+        poster_failures.pop(tmdb_path, None)
+    return path
+
+def get_catalog_posters():
+    """ক্যাটালগে থাকা TMDb পোস্টার পাথগুলো; শুধু এগুলোর জন্যই প্রক্সি ডাউনলোড করে।"""
+    def load():
+        return {m.group(1) for m in (TMDB_POSTER_RE.match(p or "") for p in movies.distinct("poster")) if m}
+    return cached("taxonomy", "posters", load, tags={"taxonomy"})
+
+def warm_poster_cache(poster):
+    """নতুন কনটেন্ট যোগ হলে ব্যাকগ্রাউন্ডে পোস্টার ক্যাশ আগে থেকেই তৈরি করে রাখা হয়।"""
+    match = TMDB_POSTER_RE.match(poster or "")
+    if not match: return
+    try:
+        get_cached_poster("w342", match.group(1))
+    except Exception as e:
+        print(f"Poster cache warm-up failed for {poster}: {e}")
+
+def schedule_poster_warmup(poster):
+    if poster and TMDB_POSTER_RE.match(poster):
+        scheduler.add_job(func=warm_poster_cache, args=[poster])
+
+@app.template_filter('poster_url')
+def poster_url(poster, size="w342"):
+    if not poster: return url_for('poster_placeholder')
+    match = TMDB_POSTER_RE.match(poster)
+    if match: return url_for('poster_image', size=size, tmdb_path=match.group(1))
+    return poster
+
+@app.template_filter('poster_srcset')
+def poster_srcset(poster):
+    if not (poster and TMDB_POSTER_RE.match(poster)): return poster_url(poster)
+    return ", ".join(f"{poster_url(poster, size)} {width}w" for size, width in POSTER_SIZES.items())
+
 def process_movie_list(movie_list):
     for item in movie_list:
         if '_id' in item: item['_id'] = str(item['_id'])
     return movie_list
 
-# ======================================================================
-# --- Main Flask Routes ---
+# --- ক্যাটালগ কোয়েরি (HTML পেজ এবং JSON API দুটোই এগুলো ব্যবহার করে) ---
+CARD_PROJECTION = {"title": 1, "poster": 1, "poster_badge": 1, "type": 1, "release_date": 1, "vote_average": 1}
+HERO_PROJECTION = {**CARD_PROJECTION, "overview": 1, "watch_link": 1, "is_coming_soon": 1}
+HOME_SECTION_LIMIT = 12
+HOME_SECTIONS = {
+    "trending_movies": {"is_trending": True, "is_coming_soon": {"$ne": True}},
+    "latest_movies": {"type": "movie", "is_coming_soon": {"$ne": True}},
+    "latest_series": {"type": "series", "is_coming_soon": {"$ne": True}},
+    "coming_soon_movies": {"is_coming_soon": True},
+    "recently_added_full": {"is_coming_soon": {"$ne": True}},
+}
+HOME_SECTION_SORT = {"trending_movies": [('trending_score', -1), ('_id', -1)]}
+
+def get_home_sections(limit=HOME_SECTION_LIMIT):
+    sections = {name: list(movies.find(query, CARD_PROJECTION).sort(HOME_SECTION_SORT.get(name, [('_id', -1)])).limit(limit)) for name, query in HOME_SECTIONS.items()}
+    # Hero Section (স্লাইডশো) এর জন্য কম আইটেম (৬টি) রাখা হয়েছে ডিজাইন ঠিক রাখার জন্য।
+    sections["recently_added"] = list(movies.find({"is_coming_soon": {"$ne": True}}, HERO_PROJECTION).sort('_id', -1).limit(6))
+    sections["all_badges"] = sorted([badge for badge in movies.distinct("poster_badge") if badge])
+    return sections
+
+def search_query(text):
+    return {"title": {"$regex": re.escape(text), "$options": "i"}}
+
+def get_title_with_related(movie_id):
+    movie = movies.find_one({"_id": ObjectId(movie_id)})
+    if not movie: return None, []
+    related_movies = []
+    if movie.get("genres"):
+        # "You might also like" সেকশনে ১২টি মুভি দেখানোর জন্য limit(12) ব্যবহার করা হয়েছে
+        related_movies = list(movies.find({"genres": {"$in": movie["genres"]}, "_id": {"$ne": movie["_id"]}}, CARD_PROJECTION).limit(12))
+    return movie, related_movies
+
+def get_cached_title(movie_id):
+    """কনটেন্ট ও তার related লিস্ট ক্যাশ থেকে; কনটেন্ট বা তার কোনো genre বদলালে বাতিল হয়।"""
+    return cached("titles", movie_id, lambda: get_title_with_related(movie_id),
+                  tags=lambda value: (movie_tags(value[0]) - {"home", "taxonomy"}) | {f"title:{movie_id}"})
+
+def get_trailer_key(movie):
+    if not (movie.get("tmdb_id") and TMDB_API_KEY): return None
+    tmdb_type = "tv" if movie.get("type") == "series" else "movie"
+    video_url = f"{TMDB_API_BASE}/{tmdb_type}/{movie['tmdb_id']}/videos?api_key={TMDB_API_KEY}"
+    try:
+        video_res = requests.get(video_url, timeout=3).json()
+        mark_dependency_ok("tmdb")
+        for v in video_res.get("results", []):
+            if v.get('type') == 'Trailer' and v.get('site') == 'YouTube':
+                return v.get('key')
+    except requests.RequestException: pass
+    return None
+
+# --- এপিসোড স্টোরেজ (আলাদা কালেকশন, (series_id, season, episode_number) দিয়ে ইনডেক্স করা) ---
+EPISODES_PER_PAGE = 50
+
+def episode_key(series_id, season, episode_number):
+    return {"series_id": series_id, "season": season, "episode_number": episode_number}
+
+def replace_series_episodes(series_id, episode_list):
+    """এডিট ফর্ম থেকে আসা পুরো এপিসোড লিস্ট দিয়ে সিরিজের এপিসোডগুলো বদলে দেওয়া হয়।
+    আগে সব মুছে না ফেলে প্রতিটি এপিসোড upsert হয়, তারপর ফর্মে না থাকা এপিসোডগুলো মোছা হয়,
+    তাই মাঝপথে কেউ সিরিজটি খালি দেখে না এবং একই সময়ে আসা webhook এর সাথে সংঘর্ষ হয় না।"""
+    unique = {(ep["season"], ep["episode_number"]): ep for ep in episode_list}
+    keep_broken_flags(unique.values(), series_episodes.find({"series_id": series_id, "broken": True}, {"message_id": 1, "broken": 1, "broken_at": 1}))
+    ops = [UpdateOne(episode_key(series_id, season, number),
+                     {"$set": ep} if ep.get("broken") else {"$set": ep, "$unset": {"broken": "", "broken_at": ""}}, upsert=True)
+           for (season, number), ep in sorted(unique.items())]
+    if ops: series_episodes.bulk_write(ops, ordered=False)
+    series_episodes.delete_many({"series_id": series_id, "$nor": [{"season": season, "episode_number": number} for season, number in unique]}
+                                if unique else {"series_id": series_id})
+
+def upsert_episode(series_id, episode):
+    # নতুন করে আপলোড হলে আগের broken চিহ্ন মুছে যায়
+    series_episodes.update_one(episode_key(series_id, episode["season"], episode["episode_number"]),
+                               {"$set": episode, "$unset": {"broken": "", "broken_at": ""}}, upsert=True)
+
+def get_series_seasons(series_id):
+    """সিজন নম্বর -> ঐ সিজনের এপিসোড সংখ্যা।"""
+    counts = series_episodes.aggregate([{"$match": {"series_id": series_id, "season": {"$ne": None}}},
+                                        {"$group": {"_id": "$season", "count": {"$sum": 1}}}])
+    return {doc["_id"]: doc["count"] for doc in counts}
+
+def get_season_episodes(series_id, season, page=1):
+    """একটি সিজনের এপিসোড, ইনডেক্স থেকেই সাজানো অবস্থায়, পেজ আকারে।"""
+    docs = list(series_episodes.find({"series_id": series_id, "season": season}, {"series_id": 0})
+                .sort("episode_number", 1).skip((page - 1) * EPISODES_PER_PAGE).limit(EPISODES_PER_PAGE + 1))
+    return docs[:EPISODES_PER_PAGE], len(docs) > EPISODES_PER_PAGE
+
+def get_all_episodes(series_id):
+    return list(series_episodes.find({"series_id": series_id}).sort([("season", 1), ("episode_number", 1)]))
+
+def get_episode_page(movie, season=None, page=1):
+    """ডিটেইল পেজ/API এর জন্য: সিজন লিস্ট, বাছাই করা সিজন ও সেই সিজনের এক পেজ এপিসোড।"""
+    movie_id = str(movie["_id"])
+    season_counts = cached("seasons", movie_id, lambda: get_series_seasons(ObjectId(movie_id)), tags={f"title:{movie_id}"})
+    seasons = sorted(season_counts)
+    selected = season if season in season_counts else (seasons[0] if seasons else None)
+    # ক্যাশ কী শুধু বাস্তবে থাকা সিজন ও পেজ দিয়ে তৈরি, query প্যারামিটার দিয়ে নয়
+    page = min(page, max(1, math.ceil(season_counts.get(selected, 0) / EPISODES_PER_PAGE)))
+    def load():
+        items, has_more = get_season_episodes(ObjectId(movie_id), selected, page) if selected is not None else ([], False)
+        return {"seasons": seasons, "season": selected, "page": page, "episodes": items, "has_more": has_more}
+    return cached("episodes", f"{movie_id}:{selected}:{page}", load, tags={f"title:{movie_id}"})
+
+def migrate_embedded_episodes():
+    """পুরনো movies.episodes অ্যারে থেকে এপিসোডগুলো episodes কালেকশনে সরানো হয় (একাধিকবার চালানো নিরাপদ)।
+    season বা episode_number ছাড়া এপিসোড সরানো যায় না; সেগুলো লগ করে অ্যারেতেই রেখে দেওয়া হয়।"""
+    moved, touched = 0, set()
+    for series in movies.find({"episodes": {"$exists": True}, "episodes_unmovable": {"$ne": True}}, {"episodes": 1}).batch_size(100):
+        movable, skipped = [], []
+        for ep in series.get("episodes") or []:
+            (movable if ep.get("season") is not None and ep.get("episode_number") is not None else skipped).append(ep)
+        ops = [UpdateOne(episode_key(series["_id"], ep["season"], ep["episode_number"]), {"$set": {**ep, "series_id": series["_id"]}}, upsert=True)
+               for ep in movable]
+        if ops: series_episodes.bulk_write(ops, ordered=False)
+        if skipped:
+            print(f"Episode migration: kept {len(skipped)} episodes without season/episode number on series {series['_id']}.")
+            movies.update_one({"_id": series["_id"]}, {"$set": {"episodes": skipped, "episodes_unmovable": True}})
+        else:
+            movies.update_one({"_id": series["_id"]}, {"$unset": {"episodes": ""}})
+        moved += len(ops)
+        touched.add(f"title:{series['_id']}")
+    if touched: publish_invalidation("catalog", touched)
+    return moved
+
+# --- টেলিগ্রাম ফাইল রেফারেন্স যাচাই (চ্যানেল থেকে মুছে যাওয়া ফাইল খুঁজে বের করা) ---
+# Bot API তে মেসেজ আছে কিনা দেখার সরাসরি উপায় নেই, তাই যাচাই চ্যাটে কপি করে সাথে সাথে মুছে ফেলা হয়।
+TELEGRAM_VERIFY_MINUTES = 15
+TELEGRAM_VERIFY_DELAY = 3  # Telegram এর প্রতি-চ্যাট লিমিটের (মিনিটে ~২০) নিচে থাকার জন্য
+TELEGRAM_MISSING_ERRORS = ("message to copy not found", "message_id_invalid", "message not found")
+
+def is_missing_message_error(res_json):
+    description = (res_json.get("description") or "").lower()
+    return res_json.get("error_code") == 400 and any(err in description for err in TELEGRAM_MISSING_ERRORS)
+
+def check_telegram_message(message_id):
+    """True = চ্যানেলে আছে, False = মুছে গেছে, None = এখন বলা যাচ্ছে না (নেটওয়ার্ক/rate limit)।"""
+    try:
+        res_json = requests.post(f"{TELEGRAM_API_URL}/copyMessage", json={
+            "chat_id": TELEGRAM_VERIFY_CHAT_ID, "from_chat_id": ADMIN_CHANNEL_ID,
+            "message_id": message_id, "disable_notification": True}, timeout=10).json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Telegram verify error for message {message_id}: {e}")
+        return None
+    if res_json.get("ok"):
+        mark_dependency_ok("telegram")
+        delete_message_after_delay(TELEGRAM_VERIFY_CHAT_ID, res_json["result"]["message_id"])
+        return True
+    if is_missing_message_error(res_json): return False
+    if res_json.get("error_code") == 429:
+        time.sleep((res_json.get("parameters") or {}).get("retry_after", TELEGRAM_VERIFY_DELAY))
+    return None
+
+def broken_ref_update(prefix, broken, now):
+    if broken:
+        return {"$set": {f"{prefix}broken": True, f"{prefix}broken_at": now}}
+    return {"$unset": {f"{prefix}broken": "", f"{prefix}broken_at": ""}}
+
+def keep_broken_flags(new_refs, old_refs):
+    """এডিট ফর্মে message_id না বদলালে আগের broken চিহ্ন থেকে যায়; নতুন message_id দিলে মুছে যায়।"""
+    broken = {ref.get("message_id"): ref.get("broken_at") for ref in old_refs if ref.get("broken")}
+    for ref in new_refs:
+        if ref.get("message_id") in broken:
+            ref.update(broken=True, broken_at=broken[ref["message_id"]])
+
+def mark_file_reference(content, message_id, broken):
+    """একটি মুভি ফাইল বা এপিসোডের broken চিহ্ন বসানো/মোছা (ডেলিভারি ব্যর্থ হলেও এখান থেকে ডাকা হয়)।"""
+    now = datetime.utcnow()
+    if content.get("type") == "series":
+        result = series_episodes.update_many({"series_id": content["_id"], "message_id": message_id}, broken_ref_update("", broken, now))
+    else:
+        result = movies.update_one({"_id": content["_id"], "files.message_id": message_id}, broken_ref_update("files.$.", broken, now))
+    if result.modified_count:
+        publish_invalidation("catalog", {f"title:{content['_id']}"})
+
+def verify_collection_refs(state_key, collection, query, projection, refs_of, budget, state):
+    """_id ক্রমে আগের রানের জায়গা থেকে শুরু করে budget পর্যন্ত রেফারেন্স যাচাই; শেষে পৌঁছালে আবার শুরু থেকে।"""
+    if budget <= 0: return 0, 0, set()
+    last_id = state.get(state_key)
+    if last_id: query = {**query, "_id": {"$gt": last_id}}
+    docs = list(collection.find(query, projection).sort("_id", 1).limit(budget))
+    ops, changed, checked = [], set(), 0
+    for doc in docs:
+        for prefix, message_id, title_id, was_broken in refs_of(doc):
+            exists = check_telegram_message(message_id)
+            checked += 1
+            time.sleep(TELEGRAM_VERIFY_DELAY)
+            if exists is None or exists != was_broken: continue
+            match = {"_id": doc["_id"], "files.message_id": message_id} if prefix else {"_id": doc["_id"]}
+            ops.append(UpdateOne(match, broken_ref_update(prefix, not exists, datetime.utcnow())))
+            changed.add(f"title:{title_id}")
+        last_id = doc["_id"]
+        if checked >= budget: break
+    else:
+        if len(docs) < budget: last_id = None
+    if ops: collection.bulk_write(ops, ordered=False)
+    state[state_key] = last_id
+    return checked, len(ops), changed
+
+def verify_telegram_files():
+    """সিডিউলার জব: প্রতি রানে সীমিত সংখ্যক files[].message_id ও এপিসোডের message_id যাচাই করে
+    মুছে যাওয়া রেফারেন্সে broken চিহ্ন দেওয়া হয় (আবার পাওয়া গেলে চিহ্ন মুছে যায়)।"""
+    if not TELEGRAM_VERIFY_CHAT_ID: return 0
+    state = meta.find_one({"_id": "telegram_verify"}) or {}
+    half = max(1, TELEGRAM_VERIFY_BATCH // 2)
+    movie_checked, movie_updates, movie_changed = verify_collection_refs(
+        "movies_last_id", movies, {"files.message_id": {"$ne": None}}, {"files": 1},
+        lambda doc: [("files.$.", f["message_id"], doc["_id"], bool(f.get("broken"))) for f in doc.get("files") or [] if f.get("message_id")],
+        half, state)
+    episode_checked, episode_updates, episode_changed = verify_collection_refs(
+        "episodes_last_id", series_episodes, {"message_id": {"$ne": None}}, {"series_id": 1, "message_id": 1, "broken": 1},
+        lambda doc: [("", doc["message_id"], doc["series_id"], bool(doc.get("broken")))],
+        TELEGRAM_VERIFY_BATCH - movie_checked, state)
+    if movie_changed or episode_changed:
+        publish_invalidation("catalog", movie_changed | episode_changed)
+    meta.update_one({"_id": "telegram_verify"}, {"$set": {
+        "movies_last_id": state.get("movies_last_id"), "episodes_last_id": state.get("episodes_last_id"),
+        "last_run": datetime.utcnow(), "last_checked": movie_checked + episode_checked}}, upsert=True)
+    print(f"Telegram verify: checked {movie_checked + episode_checked} file references, {movie_updates + episode_updates} changed.")
+    return movie_updates + episode_updates
+
+def get_broken_references():
+    """অ্যাডমিন ড্যাশবোর্ডের জন্য: যেগুলো আবার আপলোড করতে হবে।"""
+    items = []
+    for doc in movies.find({"files.broken": True}, {"title": 1, "files": 1}):
+        items += [{"title_id": doc["_id"], "title": doc.get("title"), "item": f.get("quality"), "message_id": f.get("message_id"), "broken_at": f.get("broken_at")}
+                  for f in doc.get("files") or [] if f.get("broken")]
+    episodes = list(series_episodes.find({"broken": True}, {"series_id": 1, "season": 1, "episode_number": 1, "message_id": 1, "broken_at": 1}))
+    titles = {d["_id"]: d.get("title") for d in movies.find({"_id": {"$in": list({ep["series_id"] for ep in episodes})}}, {"title": 1})}
+    items += [{"title_id": ep["series_id"], "title": titles.get(ep["series_id"]), "item": f"Season {ep.get('season')} - Episode {ep.get('episode_number')}",
+               "message_id": ep.get("message_id"), "broken_at": ep.get("broken_at")} for ep in episodes]
+    return sorted(items, key=lambda item: item["broken_at"] or datetime.min, reverse=True)
+
+# --- রেসপন্স কমপ্রেশন ---
+COMPRESS_MIN_BYTES = 512
+
+def compress_response(resp):
+    """ক্লায়েন্ট সাপোর্ট করলে brotli বা gzip দিয়ে রেসপন্স বডি কমপ্রেস করা হয়।"""
+    resp.vary.add('Accept-Encoding')
+    if resp.direct_passthrough or resp.is_streamed or 'Content-Encoding' in resp.headers: return resp
+    body = resp.get_data()
+    if len(body) < COMPRESS_MIN_BYTES: return resp
+    accepted = request.headers.get('Accept-Encoding', '')
+    if brotli and 'br' in accepted:
+        resp.set_data(brotli.compress(body, quality=5))
+        resp.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted:
+        resp.set_data(gzip.compress(body, compresslevel=6))
+        resp.headers['Content-Encoding'] = 'gzip'
+    return resp
+
+@app.after_request
+def compress_html(resp):
+    if resp.status_code == 200 and resp.mimetype == 'text/html':
+        compress_response(resp)
+    return resp
+
+# --- ফিঙ্গারপ্রিন্ট করা স্ট্যাটিক অ্যাসেট (একবার মিনিফাই ও প্রি-কমপ্রেস করা হয়) ---
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return re.sub(r':\s+', ':', text).strip()
+
+def minify_js(text):
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+def build_asset(source, mimetype):
+    body = (minify_css(source) if mimetype == 'text/css' else minify_js(source)).encode('utf-8')
+    return {
+        "body": body, "mimetype": mimetype,
+        "hash": hashlib.sha256(body).hexdigest()[:12],
+        "gzip": gzip.compress(body, compresslevel=9),
+        "br": brotli.compress(body, quality=11) if brotli else None,
+    }
+
+ASSET_SOURCES = {
+    "site.css": (site_css, 'text/css'),
+    "site.js": (site_js, 'application/javascript'),
+    "detail.css": (detail_css, 'text/css'),
+    "detail.js": (detail_js, 'application/javascript'),
+    "admin.js": (admin_js, 'application/javascript'),
+}
+static_assets = {}
+
+def get_static_asset(name):
+    """প্রথমবার দরকার হলে অ্যাসেট মিনিফাই ও কমপ্রেস করা হয়।"""
+    if name not in ASSET_SOURCES: return None
+    if name not in static_assets:
+        static_assets[name] = build_asset(*ASSET_SOURCES[name])
+    return static_assets[name]
+
+# --- টেমপ্লেট একবার কম্পাইল করে রাখা হয় (প্রতি রিকোয়েস্টে নয়) ---
+compiled_templates = {}
+
+def render_page(source, **context):
+    template = compiled_templates.get(source)
+    if template is None:
+        template = compiled_templates[source] = app.jinja_env.from_string(source)
+    return render_template(template, **context)
+
+@app.template_global()
+def asset_url(name):
+    stem, ext = os.path.splitext(name)
+    return url_for('static_asset', filename=f"{stem}.{get_static_asset(name)['hash']}{ext}")
+
+@app.route('/assets/<filename>')
+def static_asset(filename):
+    parts = filename.split('.')
+    if len(parts) != 3: abort(404)
+    asset = get_static_asset(f"{parts[0]}.{parts[2]}")
+    if not asset or asset["hash"] != parts[1]: abort(404)
+    accepted = request.headers.get('Accept-Encoding', '')
+    resp = Response(asset["body"], mimetype=asset["mimetype"])
+    if asset["br"] and 'br' in accepted:
+        resp.set_data(asset["br"])
+        resp.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted:
+        resp.set_data(asset["gzip"])
+        resp.headers['Content-Encoding'] = 'gzip'
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    resp.headers['ETag'] = f'"{asset["hash"]}"'
+    return resp
+
+# --- বাল্ক অপারেশন (একসাথে অনেক কনটেন্টে পরিবর্তন) ---
+BULK_CHUNK_SIZE = 500
+BULK_STALE_MINUTES = 10
+
+def parse_bulk_selection(form):
+    """ফর্ম থেকে MongoDB ফিল্টার তৈরি করা হয়; কোনো সিলেকশন না থাকলে ValueError।"""
+    query = {}
+    raw_ids = [i for part in form.getlist('ids') for i in re.split(r'[\s,]+', part) if i]
+    if raw_ids:
+        try:
+            query["_id"] = {"$in": [ObjectId(i) for i in raw_ids]}
+        except InvalidId:
+            raise ValueError("One or more IDs are invalid.")
+    if form.get('type') in ("movie", "series"): query["type"] = form['type']
+    if form.get('genre', '').strip(): query["genres"] = form['genre'].strip()
+    if form.get('badge', '').strip(): query["poster_badge"] = form['badge'].strip()
+    if form.get('title', '').strip(): query.update(search_query(form['title'].strip()))
+    if not query: raise ValueError("Select at least one ID or filter.")
+    return query
+
+def parse_bulk_actions(form):
+    updates = []
+    if form.get('trending') == 'set': updates.append({"$set": {"is_trending": True, "trending_pinned": True}})
+    if form.get('trending') == 'unset': updates.append({"$set": {"is_trending": False, "trending_pinned": False}})
+    if form.get('coming_soon') in ('set', 'unset'): updates.append({"$set": {"is_coming_soon": form['coming_soon'] == 'set'}})
+    if form.get('set_badge', '').strip(): updates.append({"$set": {"poster_badge": form['set_badge'].strip()}})
+    elif form.get('unset_badge') == 'true': updates.append({"$unset": {"poster_badge": ""}})
+    if form.get('add_genre', '').strip(): updates.append({"$addToSet": {"genres": form['add_genre'].strip()}})
+    if form.get('remove_genre', '').strip(): updates.append({"$pull": {"genres": form['remove_genre'].strip()}})
+    delete = form.get('delete_confirm', '').strip() == 'DELETE'
+    if not updates and not delete: raise ValueError("Choose at least one change to apply.")
+    return {"updates": updates, "delete": delete}
+
+def build_bulk_ops(actions, ids):
+    selector = {"_id": {"$in": ids}}
+    if actions["delete"]: return [DeleteMany(selector)]
+    ops = [UpdateMany(selector, update) for update in actions["updates"]]
+    # বাল্ক জবে হাতে বদলানো TMDb ফিল্ডগুলোও edited_fields এ যায়, যাতে পরের TMDb রিফ্রেশ সেগুলো ফিরিয়ে না আনে
+    edited = sorted({field for update in actions["updates"] for fields in update.values() for field in fields} & set(TMDB_REFRESH_FIELDS))
+    if edited: ops.append(UpdateMany(selector, {"$addToSet": {"edited_fields": {"$each": edited}}}))
+    return ops
+
+def run_bulk_job(job_id):
+    """আইডিগুলোর স্ন্যাপশট নিয়ে চাঙ্ক আকারে bulk_write করা হয় এবং অগ্রগতি bulk_jobs এ রাখা হয়।"""
+    job = bulk_jobs.find_one({"_id": job_id})
+    ids = job["ids"]
+    bulk_jobs.update_one({"_id": job_id}, {"$set": {"status": "running", "heartbeat": datetime.utcnow()}})
+    try:
+        # আগে থেমে যাওয়া জব processed থেকে আবার শুরু হয় (সব অপারেশন একাধিকবার চালানো নিরাপদ)
+        for start in range(job.get("processed", 0), len(ids), BULK_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_CHUNK_SIZE]
+            ops = build_bulk_ops(job["actions"], chunk)
+            result = movies.bulk_write(ops, ordered=True)
+            if job["actions"]["delete"]: series_episodes.delete_many({"series_id": {"$in": chunk}})
+            # প্রতিটি UpdateMany একই টাইটেলগুলো ম্যাচ করে, তাই ম্যাচ হওয়া টাইটেল = মোট matched / অপারেশন সংখ্যা
+            matched = 0 if job["actions"]["delete"] else result.matched_count // len(ops)
+            bulk_jobs.update_one({"_id": job_id}, {"$inc": {"processed": len(chunk), "matched": matched, "deleted": result.deleted_count},
+                                                   "$set": {"heartbeat": datetime.utcnow()}})
+        bulk_jobs.update_one({"_id": job_id}, {"$set": {"status": "done", "finished_at": datetime.utcnow()}, "$unset": {"ids": ""}})
+    except Exception as e:
+        print(f"Bulk job {job_id} failed: {e}")
+        bulk_jobs.update_one({"_id": job_id}, {"$set": {"status": "failed", "error": str(e)}})
+    publish_invalidation("catalog", {"home", "taxonomy", "titles", "genre:*", "badge:*"})
+
+def resume_stale_bulk_jobs():
+    """ওয়ার্কার মারা গেলে queued/running অবস্থায় আটকে থাকা জব (heartbeat পুরনো) যেখানে থেমেছিল সেখান থেকে আবার চালানো হয়।"""
+    while True:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(minutes=BULK_STALE_MINUTES)
+        job = bulk_jobs.find_one_and_update(
+            {"status": {"$in": ["queued", "running"]}, "$or": [{"heartbeat": {"$lt": cutoff}}, {"heartbeat": {"$exists": False}, "created_at": {"$lt": cutoff}}]},
+            {"$set": {"heartbeat": now}})
+        if not job: return
+        print(f"Resuming stale bulk job {job['_id']} at {job.get('processed', 0)}/{job.get('total', 0)}.")
+        run_bulk_job(job["_id"])
+
 # ======================================================================
 
 @app.route('/')
 def home():
     query = request.args.get('q')
     if query:
-        movies_list = list(movies.find({"title": {"$regex": query, "$options": "i"}}).sort('_id', -1))
-        return render_template_string(index_html, movies=process_movie_list(movies_list), query=f'Results for "{query}"', is_full_page_list=True)
-
-    all_badges = sorted([badge for badge in movies.distinct("poster_badge") if badge])
-    # এই limit ভেরিয়েবলটি প্রতিটি সেকশনে কতগুলো আইটেম দেখাবে তা নিয়ন্ত্রণ করে।
-    limit = 12
-    context = {
-        "trending_movies": process_movie_list(list(movies.find({"is_trending": True, "is_coming_soon": {"$ne": True}}).sort('_id', -1).limit(limit))),
-        "latest_movies": process_movie_list(list(movies.find({"type": "movie", "is_coming_soon": {"$ne": True}}).sort('_id', -1).limit(limit))),
-        "latest_series": process_movie_list(list(movies.find({"type": "series", "is_coming_soon": {"$ne": True}}).sort('_id', -1).limit(limit))),
-        "coming_soon_movies": process_movie_list(list(movies.find({"is_coming_soon": True}).sort('_id', -1).limit(limit))),
-        # Hero Section (স্লাইডশো) এর জন্য কম আইটেম (৬টি) রাখা হয়েছে ডিজাইন ঠিক রাখার জন্য।
-        "recently_added": process_movie_list(list(movies.find({"is_coming_soon": {"$ne": True}}).sort('_id', -1).limit(6))),
-        # "Recently Added" গ্রিড সেকশনের জন্য ১২টি আইটেম।
-        "recently_added_full": process_movie_list(list(movies.find({"is_coming_soon": {"$ne": True}}).sort('_id', -1).limit(limit))),
-        "is_full_page_list": False, "query": "", "all_badges": all_badges
-    }
-    return render_template_string(index_html, **context)
+        retry_after = rate_limit_exceeded("search", client_ip())
+        if retry_after: return too_many_requests(retry_after)
+        movies_list = list(movies.find(search_query(query), CARD_PROJECTION).sort('_id', -1))
+        return render_page(index_html, movies=process_movie_list(movies_list), query=f'Results for "{query}"', is_full_page_list=True)
+
+    context = cached("pages", "home", get_home_sections, tags={"home"})
+    for name in list(HOME_SECTIONS) + ["recently_added"]:
+        process_movie_list(context[name])
+    return render_page(index_html, is_full_page_list=False, query="", **context)
 
 @app.route('/movie/<movie_id>')
 def movie_detail(movie_id):
     try:
-        movie = movies.find_one({"_id": ObjectId(movie_id)})
+        movie, related_movies = get_cached_title(movie_id)
         if not movie: return "Content not found", 404
-
-        related_movies = []
-        if movie.get("genres"):
-            # "You might also like" সেকশনে ১২টি মুভি দেখানোর জন্য limit(12) ব্যবহার করা হয়েছে
-            related_movies = list(movies.find({"genres": {"$in": movie["genres"]}, "_id": {"$ne": ObjectId(movie_id)}}).limit(12))
-
-        trailer_key = None
-        if movie.get("tmdb_id") and TMDB_API_KEY:
-            tmdb_type = "tv" if movie.get("type") == "series" else "movie"
-            video_url = f"https://api.themoviedb.org/3/{tmdb_type}/{movie['tmdb_id']}/videos?api_key={TMDB_API_KEY}"
-            try:
-                video_res = requests.get(video_url, timeout=3).json()
-                for v in video_res.get("results", []):
-                    if v.get('type') == 'Trailer' and v.get('site') == 'YouTube':
-                        trailer_key = v.get('key'); break
-            except requests.RequestException: pass
-
-        return render_template_string(detail_html, movie=movie, trailer_key=trailer_key, related_movies=process_movie_list(related_movies))
+        track_event("page_view", movie["_id"])
+        trailer_key = cached("trailers", movie_id, lambda: get_trailer_key(movie), tags={f"title:{movie_id}"}, ttl=24 * 3600)
+        episode_page = get_episode_page(movie, request.args.get('season', type=int), max(request.args.get('page', 1, type=int), 1)) if movie.get("type") == "series" else None
+        return render_page(detail_html, movie=movie, trailer_key=trailer_key, episode_page=episode_page, related_movies=process_movie_list(related_movies))
     except Exception as e: return f"An error occurred: {e}", 500
 
 @app.route('/watch/<movie_id>')
@@ -688,20 +1728,53 @@ def watch_movie(movie_id):
     try:
         movie = movies.find_one({"_id": ObjectId(movie_id)})
         if not movie or not movie.get("watch_link"): return "Content not found.", 404
-        return render_template_string(watch_html, watch_link=movie["watch_link"], title=movie["title"])
+        return render_page(watch_html, watch_link=movie["watch_link"], title=movie["title"])
     except Exception as e: return "An error occurred.", 500
 
+@app.route('/img/placeholder.svg')
+def poster_placeholder():
+    resp = Response(PLACEHOLDER_SVG, mimetype='image/svg+xml')
+    resp.headers['Cache-Control'] = f'public, max-age={IMAGE_CACHE_MAX_AGE}, immutable'
+    return resp
+
+@app.route('/img/<size>/<tmdb_path>')
+def poster_image(size, tmdb_path):
+    if size not in POSTER_SIZES or not re.fullmatch(r'[A-Za-z0-9_-]+\.(?:jpg|jpeg|png)', tmdb_path):
+        abort(404)
+    # ডিস্কে না থাকলে শুধু ক্যাটালগের পোস্টারই TMDb থেকে আনা হয়, যেকোনো পাথ নয়
+    if not os.path.exists(poster_cache_path(size, tmdb_path)) and tmdb_path not in get_catalog_posters():
+        abort(404)
+    try:
+        path = get_cached_poster(size, tmdb_path)
+    except Exception as e:
+        print(f"Poster proxy error for {size}/{tmdb_path}: {e}")
+        return redirect(url_for('poster_placeholder'))
+    resp = send_file(os.path.abspath(path), mimetype='image/webp', max_age=IMAGE_CACHE_MAX_AGE, conditional=True)
+    resp.headers['Cache-Control'] = f'public, max-age={IMAGE_CACHE_MAX_AGE}, immutable'
+    return resp
+
+def get_genres():
+    return cached("taxonomy", "genres", lambda: sorted([g for g in movies.distinct("genres") if g]), tags={"taxonomy"})
+
+def get_badges():
+    return cached("taxonomy", "badges", lambda: {b for b in movies.distinct("poster_badge") if b}, tags={"taxonomy"})
+
 def render_full_list(content_list, title):
-    return render_template_string(index_html, movies=process_movie_list(content_list), query=title, is_full_page_list=True)
+    return render_page(index_html, movies=process_movie_list(content_list), query=title, is_full_page_list=True)
 
 @app.route('/badge/<badge_name>')
-def movies_by_badge(badge_name): return render_full_list(list(movies.find({"poster_badge": badge_name}).sort('_id', -1)), f'Tag: {badge_name}')
+def movies_by_badge(badge_name):
+    if badge_name not in get_badges(): return render_full_list([], f'Tag: {badge_name}')
+    return render_full_list(cached("lists", f"badge:{badge_name}", lambda: list(movies.find({"poster_badge": badge_name}, CARD_PROJECTION).sort('_id', -1)), tags={f"badge:{badge_name}"}), f'Tag: {badge_name}')
 @app.route('/genres')
-def genres_page(): return render_template_string(genres_html, genres=sorted([g for g in movies.distinct("genres") if g]), title="Browse by Genre")
+def genres_page(): return render_page(genres_html, genres=get_genres(), title="Browse by Genre")
 @app.route('/genre/<genre_name>')
-def movies_by_genre(genre_name): return render_full_list(list(movies.find({"genres": genre_name}).sort('_id', -1)), f'Genre: {genre_name}')
+def movies_by_genre(genre_name):
+    # অজানা genre/ট্যাগ এর জন্য ক্যাশ এন্ট্রি তৈরি হয় না
+    if genre_name not in get_genres(): return render_full_list([], f'Genre: {genre_name}')
+    return render_full_list(cached("lists", f"genre:{genre_name}", lambda: list(movies.find({"genres": genre_name}, CARD_PROJECTION).sort('_id', -1)), tags={f"genre:{genre_name}"}), f'Genre: {genre_name}')
 @app.route('/trending_movies')
-def trending_movies(): return render_full_list(list(movies.find({"is_trending": True, "is_coming_soon": {"$ne": True}}).sort('_id', -1)), "Trending Now")
+def trending_movies(): return render_full_list(list(movies.find({"is_trending": True, "is_coming_soon": {"$ne": True}}).sort(HOME_SECTION_SORT["trending_movies"])), "Trending Now")
 @app.route('/movies_only')
 def movies_only(): return render_full_list(list(movies.find({"type": "movie", "is_coming_soon": {"$ne": True}}).sort('_id', -1)), "All Movies")
 @app.route('/webseries')
@@ -711,6 +1784,237 @@ def coming_soon(): return render_full_list(list(movies.find({"is_coming_soon": T
 @app.route('/recently_added')
 def recently_added_all(): return render_full_list(list(movies.find({"is_coming_soon": {"$ne": True}}).sort('_id', -1)), "Recently Added")
 
+# ======================================================================
+# --- Sitemap, RSS Feed ও robots.txt ---
+# ======================================================================
+SITEMAP_MAX_URLS = 50000
+FEED_SIZE = 50
+SITEMAP_PAGE_ENDPOINTS = ['home', 'genres_page']
+# এই লিস্ট পেজগুলো পুরো ক্যাটালগ একবারে লোড করে, তাই ক্রলারদের জন্য বন্ধ রাখা হয়
+CRAWL_BLOCKED_ENDPOINTS = ['trending_movies', 'movies_only', 'webseries', 'coming_soon', 'recently_added_all']
+feed_cache = {}  # name -> (catalog version, rendered bytes); শুধু sitemap index, pages ও feed
+
+def cached_xml(name, generate, mimetype='application/xml', keep_body=False):
+    """XML জেনারেটর থেকে স্ট্রিম করে পাঠানো হয়; ক্যাটালগ ভার্সন না বদলালে ETag দিয়ে 304।
+    শুধু ছোট, নির্দিষ্ট সাইজের ডকুমেন্ট (keep_body) মেমরিতে রাখা হয়; টাইটেল লিস্ট প্রতিবার স্ট্রিম হয়,
+    যাতে ক্যাটালগ বড় হলেও ওয়ার্কারের মেমরি না বাড়ে।"""
+    version = get_catalog_version()
+    etag = f"{name}-{version}"
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    entry = feed_cache.get(name) if keep_body else None
+    if entry and entry[0] == version:
+        resp = Response(entry[1], mimetype=mimetype)
+    elif keep_body:
+        def tee():
+            chunks = []
+            for chunk in generate():
+                chunks.append(chunk)
+                yield chunk
+            feed_cache[name] = (version, "".join(chunks).encode('utf-8'))
+        resp = Response(stream_with_context(tee()), mimetype=mimetype)
+    else:
+        resp = Response(stream_with_context(generate()), mimetype=mimetype)
+    resp.headers['ETag'] = f'"{etag}"'
+    resp.headers['Cache-Control'] = 'public, max-age=3600'
+    return resp
+
+def sitemap_url(loc, lastmod=None):
+    return f"<url><loc>{xml_escape(loc)}</loc>{f'<lastmod>{lastmod}</lastmod>' if lastmod else ''}</url>\n"
+
+def generate_page_urls():
+    for endpoint in SITEMAP_PAGE_ENDPOINTS:
+        yield sitemap_url(url_for(endpoint, _external=True))
+
+def generate_title_urls(shard=None):
+    query = {}
+    if shard is not None:
+        first = list(movies.find({}, {"_id": 1}).sort('_id', 1).skip(shard * SITEMAP_MAX_URLS).limit(1))
+        if not first: return
+        query = {"_id": {"$gte": first[0]["_id"]}}
+    cursor = movies.find(query, {"_id": 1}).sort('_id', 1).batch_size(1000)
+    if shard is not None: cursor = cursor.limit(SITEMAP_MAX_URLS)
+    for doc in cursor:
+        yield sitemap_url(url_for('movie_detail', movie_id=str(doc["_id"]), _external=True), doc["_id"].generation_time.date().isoformat())
+
+def generate_urlset(*sources):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for source in sources:
+        yield from source
+    yield '</urlset>\n'
+
+def generate_sitemap_index(shards):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    yield f"<sitemap><loc>{xml_escape(url_for('sitemap_pages', _external=True))}</loc></sitemap>\n"
+    for shard in range(shards):
+        yield f"<sitemap><loc>{xml_escape(url_for('sitemap_titles', shard=shard, _external=True))}</loc></sitemap>\n"
+    yield '</sitemapindex>\n'
+
+def generate_feed():
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>'
+           f"<title>movieflix9u</title><link>{xml_escape(url_for('home', _external=True))}</link>"
+           "<description>Latest movies and web series on movieflix9u</description>\n")
+    cursor = movies.find({"is_coming_soon": {"$ne": True}}, {"title": 1, "overview": 1, "poster": 1}).sort('_id', -1).limit(FEED_SIZE)
+    for doc in cursor:
+        link = url_for('movie_detail', movie_id=str(doc["_id"]), _external=True)
+        yield (f"<item><title>{xml_escape(doc.get('title') or '')}</title><link>{xml_escape(link)}</link>"
+               f'<guid isPermaLink="true">{xml_escape(link)}</guid>'
+               f"<pubDate>{format_datetime(doc['_id'].generation_time)}</pubDate>"
+               f"<description>{xml_escape((doc.get('overview') or '')[:500])}</description></item>\n")
+    yield '</channel></rss>\n'
+
+@app.route('/sitemap.xml')
+def sitemap():
+    total = movies.estimated_document_count()
+    if total + len(SITEMAP_PAGE_ENDPOINTS) <= SITEMAP_MAX_URLS:
+        return cached_xml('sitemap', lambda: generate_urlset(generate_page_urls(), generate_title_urls()))
+    shards = math.ceil(total / SITEMAP_MAX_URLS)
+    return cached_xml('sitemap', lambda: generate_sitemap_index(shards), keep_body=True)
+
+@app.route('/sitemap-pages.xml')
+def sitemap_pages():
+    return cached_xml('sitemap-pages', lambda: generate_urlset(generate_page_urls()), keep_body=True)
+
+@app.route('/sitemap-titles-<int:shard>.xml')
+def sitemap_titles(shard):
+    return cached_xml(f'sitemap-titles-{shard}', lambda: generate_urlset(generate_title_urls(shard)))
+
+@app.route('/feed.xml')
+def rss_feed():
+    return cached_xml('feed', generate_feed, mimetype='application/rss+xml', keep_body=True)
+
+@app.route('/robots.txt')
+def robots_txt():
+    lines = ["User-agent: *"]
+    lines += [f"Disallow: {url_for(endpoint)}" for endpoint in CRAWL_BLOCKED_ENDPOINTS]
+    lines += ["Disallow: /genre/", "Disallow: /badge/", "Disallow: /admin", "Disallow: /api/", f"Sitemap: {url_for('sitemap', _external=True)}"]
+    resp = Response("\n".join(lines) + "\n", mimetype='text/plain')
+    resp.headers['Cache-Control'] = 'public, max-age=86400'
+    return resp
+
+# ======================================================================
+# --- Public JSON API (v1) ---
+# ======================================================================
+API_DEFAULT_LIMIT = 24
+API_MAX_LIMIT = 100
+
+def to_api_value(value):
+    if isinstance(value, ObjectId): return str(value)
+    if isinstance(value, datetime): return value.isoformat()
+    if isinstance(value, dict): return {k: to_api_value(v) for k, v in value.items()}
+    if isinstance(value, list): return [to_api_value(v) for v in value]
+    return value
+
+def to_api_card(doc):
+    card = {k: doc.get(k) for k in CARD_PROJECTION if doc.get(k) is not None}
+    card["id"] = str(doc["_id"])
+    if card.get("poster"): card["poster"] = poster_url(card["poster"], "w342")
+    return card
+
+DETAIL_FIELDS = (*CARD_PROJECTION, "overview", "genres", "is_coming_soon")
+
+def to_api_detail(movie):
+    """ডিটেইল রেসপন্সেও শুধু নির্দিষ্ট পাবলিক ফিল্ড যায়; message_id বা অভ্যন্তরীণ ফিল্ড নয়।"""
+    detail = {k: movie.get(k) for k in DETAIL_FIELDS if movie.get(k) is not None}
+    detail["id"] = str(movie["_id"])
+    if detail.get("poster"): detail["poster"] = poster_url(detail["poster"], "w500")
+    detail["has_watch_link"] = bool(movie.get("watch_link"))
+    detail["links"] = [{"quality": l.get("quality"), "url": l.get("url")} for l in movie.get("links") or []]
+    detail["telegram_qualities"] = sorted(f.get("quality") for f in movie.get("files") or [] if f.get("quality") and not f.get("broken"))
+    return detail
+
+def to_api_episode(ep):
+    return {"season": ep.get("season"), "episode_number": ep.get("episode_number"), "title": ep.get("title"),
+            "has_watch_link": bool(ep.get("watch_link")), "on_telegram": bool(ep.get("message_id")) and not ep.get("broken")}
+
+def api_response(payload, status=200, max_age=60):
+    """JSON (অথবা Accept হেডারে চাইলে MessagePack) রেসপন্স, ETag ও কমপ্রেশন সহ।"""
+    payload = to_api_value(payload)
+    if msgpack and 'application/msgpack' in request.headers.get('Accept', ''):
+        resp = Response(msgpack.packb(payload, use_bin_type=True), status=status, mimetype='application/msgpack')
+    else:
+        resp = Response(json.dumps(payload, separators=(',', ':'), ensure_ascii=False), status=status, mimetype='application/json')
+    resp.vary.add('Accept')
+    resp.headers['Cache-Control'] = f'public, max-age={max_age}'
+    resp.add_etag(weak=True)
+    resp.make_conditional(request)
+    return compress_response(resp) if resp.status_code == 200 else resp
+
+def api_error(message, status):
+    return api_response({"error": message}, status=status, max_age=0)
+
+def api_page(query):
+    """_id এর উপর keyset pagination: ?cursor=<last id>&limit=N"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', API_DEFAULT_LIMIT)), API_MAX_LIMIT))
+    except ValueError:
+        limit = API_DEFAULT_LIMIT
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query = {**query, "_id": {"$lt": ObjectId(cursor)}}
+        except InvalidId:
+            return None
+    docs = list(movies.find(query, CARD_PROJECTION).sort('_id', -1).limit(limit + 1))
+    next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return {"items": [to_api_card(d) for d in docs[:limit]], "next_cursor": next_cursor}
+
+@app.before_request
+def limit_api_requests():
+    if request.path.startswith('/api/'):
+        retry_after = rate_limit_exceeded("api", client_ip())
+        if retry_after:
+            resp = api_error("Too many requests", 429)
+            resp.headers['Retry-After'] = str(retry_after)
+            return resp
+
+@app.route('/api/v1/home')
+def api_home():
+    sections = cached("pages", "home", get_home_sections, tags={"home"})
+    payload = {name: [to_api_card(d) for d in sections[name]] for name in list(HOME_SECTIONS) + ["recently_added"]}
+    payload["badges"] = sections["all_badges"]
+    return api_response(payload)
+
+@app.route('/api/v1/titles')
+def api_titles():
+    query = {}
+    if request.args.get('type') in ("movie", "series"): query["type"] = request.args['type']
+    if request.args.get('genre'): query["genres"] = request.args['genre']
+    if request.args.get('badge'): query["poster_badge"] = request.args['badge']
+    if request.args.get('trending') == '1': query["is_trending"] = True
+    if request.args.get('coming_soon') == '1': query["is_coming_soon"] = True
+    elif request.args.get('coming_soon') != 'any': query["is_coming_soon"] = {"$ne": True}
+    page = api_page(query)
+    if page is None: return api_error("Invalid cursor", 400)
+    return api_response(page)
+
+@app.route('/api/v1/titles/<movie_id>')
+def api_title_detail(movie_id):
+    try:
+        movie, related_movies = get_cached_title(movie_id)
+    except InvalidId:
+        return api_error("Invalid id", 400)
+    if not movie: return api_error("Content not found", 404)
+    detail = to_api_detail(movie)
+    if movie.get("type") == "series":
+        episode_page = get_episode_page(movie, request.args.get('season', type=int), max(request.args.get('page', 1, type=int), 1))
+        detail["episodes"] = {**episode_page, "episodes": [to_api_episode(ep) for ep in episode_page["episodes"]]}
+    detail["related"] = [to_api_card(d) for d in related_movies]
+    return api_response(detail, max_age=300)
+
+@app.route('/api/v1/search')
+def api_search():
+    text = request.args.get('q', '').strip()
+    if not text: return api_error("Missing q parameter", 400)
+    retry_after = rate_limit_exceeded("search", client_ip())
+    if retry_after:
+        resp = api_error("Too many requests", 429)
+        resp.headers['Retry-After'] = str(retry_after)
+        return resp
+    page = api_page(search_query(text))
+    if page is None: return api_error("Invalid cursor", 400)
+    return api_response(page)
+
 # ======================================================================
 # --- Admin and Webhook Routes ---
 # ======================================================================
@@ -728,9 +2032,9 @@ def admin():
             "is_trending": False,
             "is_coming_soon": False,
             "links": [],
-            "files": [],
-            "episodes": []
+            "files": []
         }
+        episodes = []
 
         if content_type == "movie":
             movie_data["watch_link"] = request.form.get("watch_link", "")
@@ -760,14 +2064,16 @@ def admin():
                     "message_id": int(request.form.getlist('episode_message_id[]')[i]) if request.form.getlist('episode_message_id[]')[i] else None
                 }
                 episodes.append(episode_doc)
-            movie_data["episodes"] = episodes
 
         movies.insert_one(movie_data)
+        if episodes: replace_series_episodes(movie_data["_id"], episodes)
+        publish_invalidation("catalog", movie_tags(movie_data))
+        schedule_poster_warmup(movie_data.get("poster"))
         return redirect(url_for('admin'))
 
     all_content = process_movie_list(list(movies.find().sort('_id', -1)))
     feedback_list = process_movie_list(list(feedback.find().sort('timestamp', -1)))
-    return render_template_string(admin_html, all_content=all_content, feedback_list=feedback_list)
+    return render_page(admin_html, all_content=all_content, feedback_list=feedback_list, broken_refs=get_broken_references())
 
 @app.route('/admin/save_ads', methods=['POST'])
 @requires_auth
@@ -779,8 +2085,46 @@ def save_ads():
         "native_banner_code": request.form.get("native_banner_code", "")
     }
     settings.update_one({}, {"$set": ad_codes}, upsert=True)
+    publish_invalidation("settings", {"settings"})
     return redirect(url_for('admin'))
 
+@app.route('/admin/bulk', methods=['GET', 'POST'])
+@requires_auth
+def bulk_operations():
+    recent_jobs = list(bulk_jobs.find({}, {"ids": 0}).sort('_id', -1).limit(10))
+    form = request.form if request.method == 'POST' else request.args
+    context = {"job": None, "error": None, "dry_run_count": None, "recent_jobs": recent_jobs, "form": {**form, "ids": "\n".join(form.getlist('ids'))}}
+    if request.method == 'GET':
+        return render_page(bulk_html, **context)
+    try:
+        query = parse_bulk_selection(form)
+        if form.get('dry_run') == 'true':
+            context["dry_run_count"] = movies.count_documents(query)
+            return render_page(bulk_html, **context)
+        actions = parse_bulk_actions(form)
+    except ValueError as e:
+        context["error"] = str(e)
+        return render_page(bulk_html, **context)
+
+    ids = [doc["_id"] for doc in movies.find(query, {"_id": 1})]
+    job = {"status": "queued", "actions": actions, "ids": ids, "total": len(ids), "processed": 0,
+           "matched": 0, "deleted": 0, "created_at": datetime.utcnow()}
+    job_id = bulk_jobs.insert_one(job).inserted_id
+    if len(ids) <= BULK_CHUNK_SIZE:
+        run_bulk_job(job_id)
+    else:
+        scheduler.add_job(func=run_bulk_job, args=[job_id], id=f'bulk_{job_id}')
+    return redirect(url_for('bulk_job_status', job_id=str(job_id)))
+
+@app.route('/admin/bulk/<job_id>')
+@requires_auth
+def bulk_job_status(job_id):
+    job = bulk_jobs.find_one({"_id": ObjectId(job_id)}, {"ids": 0})
+    if not job: return "Job not found", 404
+    if request.args.get('format') == 'json':
+        return jsonify({**job, "_id": str(job["_id"])})
+    return render_page(bulk_html, job=job, recent_jobs=[], form={})
+
 @app.route('/edit_movie/<movie_id>', methods=["GET", "POST"])
 @requires_auth
 def edit_movie(movie_id):
@@ -791,7 +2135,7 @@ def edit_movie(movie_id):
         content_type = request.form.get("content_type", "movie")
         update_data = {
             "title": request.form.get("title"), "type": content_type,
-            "is_trending": request.form.get("is_trending") == "true",
+            "trending_pinned": request.form.get("trending_pinned") == "true",
             "is_coming_soon": request.form.get("is_coming_soon") == "true",
             "poster": request.form.get("poster", "").strip(),
             "overview": request.form.get("overview", "").strip(),
@@ -814,8 +2158,9 @@ def edit_movie(movie_id):
             for i in range(len(qualities)):
                  if qualities[i] and message_ids[i]:
                     files.append({"quality": qualities[i], "message_id": int(message_ids[i])})
+            keep_broken_flags(files, movie_obj.get("files") or [])
             update_data["files"] = files
-            movies.update_one({"_id": ObjectId(movie_id)}, {"$unset": {"episodes": ""}})
+            series_episodes.delete_many({"series_id": ObjectId(movie_id)})
 
         else: # Series
             episodes = []
@@ -829,33 +2174,44 @@ def edit_movie(movie_id):
                     "message_id": int(request.form.getlist('episode_message_id[]')[i]) if request.form.getlist('episode_message_id[]')[i] else None
                 }
                 episodes.append(episode_doc)
-            update_data["episodes"] = episodes
+            replace_series_episodes(ObjectId(movie_id), episodes)
             movies.update_one({"_id": ObjectId(movie_id)}, {"$unset": {"links": "", "watch_link": "", "files": ""}})
 
-        movies.update_one({"_id": ObjectId(movie_id)}, {"$set": update_data})
+        if update_data["trending_pinned"]: update_data["is_trending"] = True
+        # আনপিন করলে ট্রেন্ডিং থেকে সরে যায়, যদি না ভিউ/ডাউনলোডের স্কোর থেকে ট্রেন্ডিং হয়ে থাকে
+        elif movie_obj.get("trending_pinned") or not movie_obj.get("trending_score"): update_data["is_trending"] = False
+        # অ্যাডমিন যে TMDb ফিল্ড হাতে বদলেছেন সেগুলো অটো রিফ্রেশে আর বদলাবে না
+        edited = [f for f in ("title", "poster", "overview", "genres") if (update_data.get(f) or None) != (movie_obj.get(f) or None)]
+        movies.update_one({"_id": ObjectId(movie_id)}, {"$set": update_data, "$addToSet": {"edited_fields": {"$each": edited}}})
+        publish_invalidation("catalog", movie_tags(movie_obj, update_data))
         return redirect(url_for('admin'))
 
-    return render_template_string(edit_html, movie=movie_obj)
+    return render_page(edit_html, movie=movie_obj, episodes=get_all_episodes(movie_obj["_id"]))
 
 @app.route('/delete_movie/<movie_id>')
 @requires_auth
 def delete_movie(movie_id):
-    movies.delete_one({"_id": ObjectId(movie_id)})
+    deleted = movies.find_one_and_delete({"_id": ObjectId(movie_id)}, projection={"genres": 1, "poster_badge": 1})
+    if deleted:
+        series_episodes.delete_many({"series_id": deleted["_id"]})
+        publish_invalidation("catalog", movie_tags(deleted))
     return redirect(url_for('admin'))
 
 @app.route('/contact', methods=['GET', 'POST'])
 def contact():
     if request.method == 'POST':
+        retry_after = rate_limit_exceeded("contact", client_ip())
+        if retry_after: return too_many_requests(retry_after)
         feedback_data = {
             "type": request.form.get("type"), "content_title": request.form.get("content_title"),
             "message": request.form.get("message"), "email": request.form.get("email", "").strip(),
             "reported_content_id": request.form.get("reported_content_id"), "timestamp": datetime.utcnow()
         }
         feedback.insert_one(feedback_data)
-        return render_template_string(contact_html, message_sent=True)
+        return render_page(contact_html, message_sent=True)
     prefill_title, prefill_id = request.args.get('title', ''), request.args.get('report_id', '')
     prefill_type = 'Problem Report' if prefill_id else 'Movie Request'
-    return render_template_string(contact_html, message_sent=False, prefill_title=prefill_title, prefill_id=prefill_id, prefill_type=prefill_type)
+    return render_page(contact_html, message_sent=False, prefill_title=prefill_title, prefill_id=prefill_id, prefill_type=prefill_type)
 
 @app.route('/delete_feedback/<feedback_id>')
 @requires_auth
@@ -863,6 +2219,40 @@ def delete_feedback(feedback_id):
     feedback.delete_one({"_id": ObjectId(feedback_id)})
     return redirect(url_for('admin'))
 
+@app.route('/healthz')
+def healthz():
+    return Response('ok', mimetype='text/plain', headers={'Cache-Control': 'no-store'})
+
+@app.route('/readyz')
+def readyz():
+    checked_at = health_state["checked_at"]
+    stale = checked_at is None or datetime.utcnow() - checked_at > timedelta(seconds=HEALTH_CHECK_SECONDS * 3)
+    ready = health_state["mongo"]["ok"] and server_state["indexes_ready"] and not stale
+    payload = {
+        **health_state, "ready": ready, "stale": stale, "indexes_ready": server_state["indexes_ready"],
+        "scheduler_leader": leader_state["leader"],
+        "invalidation_mode": invalidation_state["mode"],
+        "last_ok": {name: ts.isoformat() + "Z" if ts else None for name, ts in dependency_last_ok.items()},
+    }
+    if checked_at: payload["checked_at"] = checked_at.isoformat() + "Z"
+    resp = jsonify(payload)
+    resp.status_code = 200 if ready else 503
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+@app.route('/metrics')
+@requires_auth
+def metrics():
+    lines = []
+    with rate_limit_lock:
+        for route, counts in rate_limit_stats.items():
+            limit, period = RATE_LIMITS[route]
+            lines.append(f'rate_limit_config{{route="{route}",period="{period}"}} {limit}')
+            lines.append(f'rate_limit_allowed_total{{route="{route}"}} {counts["allowed"]}')
+            lines.append(f'rate_limit_rejected_total{{route="{route}"}} {counts["rejected"]}')
+        lines.append(f'rate_limit_tracked_keys {len(rate_limit_windows)}')
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4')
+
 @app.route('/webhook', methods=['POST'])
 def telegram_webhook():
     data = request.get_json()
@@ -901,13 +2291,14 @@ def telegram_webhook():
                 "message_id": post['message_id'], "quality": quality
             }
             if existing_series:
-                # Remove episode with same season/ep number before adding new one to avoid duplicates
-                movies.update_one({"_id": existing_series['_id']}, {"$pull": {"episodes": {"season": new_episode['season'], "episode_number": new_episode['episode_number']}}})
-                movies.update_one({"_id": existing_series['_id']}, {"$push": {"episodes": new_episode}})
+                # একই season/episode আগে থাকলে সেটাই আপডেট হবে (unique index), ডুপ্লিকেট হবে না
+                upsert_episode(existing_series['_id'], new_episode)
                 print(f"Webhook: Updated series '{existing_series['title']}'.")
             else:
-                series_doc = {**tmdb_data, "type": "series", "is_trending": False, "is_coming_soon": False, "episodes": [new_episode]}
+                series_doc = {**tmdb_data, "type": "series", "is_trending": False, "is_coming_soon": False}
                 movies.insert_one(series_doc)
+                upsert_episode(series_doc['_id'], new_episode)
+                schedule_poster_warmup(series_doc.get("poster"))
                 print(f"Webhook: Created new series '{tmdb_data.get('title')}'.")
 
         else: # type == 'movie'
@@ -921,7 +2312,9 @@ def telegram_webhook():
             else:
                 movie_doc = {**tmdb_data, "type": "movie", "is_trending": False, "is_coming_soon": False, "files": [new_file]}
                 movies.insert_one(movie_doc)
+                schedule_poster_warmup(movie_doc.get("poster"))
                 print(f"Webhook: Created new movie '{tmdb_data.get('title')}'.")
+        publish_invalidation("catalog", movie_tags(existing_series if parsed_info['type'] == 'series' else existing_movie, tmdb_data))
 
     elif 'message' in data:
         message = data['message']
@@ -930,6 +2323,10 @@ def telegram_webhook():
         if text.startswith('/start'):
             parts = text.split()
             if len(parts) > 1:
+                # লিমিট ছাড়ালে কোনো Telegram বা ডাটাবেস কল ছাড়াই চুপচাপ বাদ দেওয়া হয়
+                if rate_limit_exceeded("start", chat_id):
+                    print(f"Rate limited /start from chat {chat_id}")
+                    return jsonify(status='ok', reason='rate_limited')
                 try:
                     payload_parts = parts[1].split('_')
                     doc_id_str = payload_parts[0]
@@ -941,7 +2338,7 @@ def telegram_webhook():
                     message_to_copy_id = None
                     if content.get('type') == 'series' and len(payload_parts) == 3:
                         s_num, e_num = int(payload_parts[1]), int(payload_parts[2])
-                        target_episode = next((ep for ep in content.get('episodes', []) if ep.get('season') == s_num and ep.get('episode_number') == e_num), None)
+                        target_episode = series_episodes.find_one(episode_key(content['_id'], s_num, e_num), {"message_id": 1})
                         if target_episode: message_to_copy_id = target_episode.get('message_id')
                     elif content.get('type') == 'movie' and len(payload_parts) == 2:
                         quality_to_find = payload_parts[1]
@@ -954,6 +2351,7 @@ def telegram_webhook():
                         res_json = res.json()
 
                         if res_json.get('ok'):
+                            mark_dependency_ok("telegram")
                             new_message_id = res_json['result']['message_id']
                             run_time = datetime.now() + timedelta(minutes=30)
 
@@ -966,8 +2364,13 @@ def telegram_webhook():
                                 replace_existing=True
                             )
                             print(f"Scheduled message {new_message_id} for deletion in chat {chat_id} at {run_time}")
+                            if content.get('type') == 'series':
+                                track_event("delivery", content['_id'], season=s_num, episode=e_num)
+                            else:
+                                track_event("delivery", content['_id'], quality=quality_to_find)
                         else:
                              print(f"Failed to copy message: {res.text}")
+                             if is_missing_message_error(res_json): mark_file_reference(content, message_to_copy_id, True)
                              requests.get(f"{TELEGRAM_API_URL}/sendMessage", params={'chat_id': chat_id, 'text': "Error sending file. It might have been deleted from the channel."})
                     else:
                         requests.get(f"{TELEGRAM_API_URL}/sendMessage", params={'chat_id': chat_id, 'text': "Requested file or episode not found."})
@@ -979,6 +2382,208 @@ def telegram_webhook():
 
     return jsonify(status='ok')
 
+# ======================================================================
+# --- অফলাইন ক্যাটালগ এক্সপোর্ট / ইমপোর্ট (চাঙ্ক করা, কমপ্রেসড NDJSON) ---
+# ======================================================================
+EXPORT_COLLECTIONS = {"movies": movies, "episodes": series_episodes, "feedback": feedback, "settings": settings}
+EXPORT_PART_DOCS = 10000
+IMPORT_BATCH_DOCS = 1000
+EXPORT_JSON_OPTIONS = json_util.JSONOptions(json_mode=json_util.JSONMode.RELAXED)
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(data, fh, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+def read_json(path, default=None):
+    if default is not None and not os.path.exists(path): return default
+    with open(path) as fh:
+        return json.load(fh)
+
+def open_part_for_write(path):
+    if path.endswith(".zst"):
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"))
+    return gzip.open(path, "wb", compresslevel=6)
+
+def open_part_for_read(path):
+    if path.endswith(".zst"):
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+def export_catalog(out_dir, names=None, fresh=False):
+    """কালেকশনগুলো _id ক্রমে ব্যাচ কার্সর দিয়ে পড়ে আলাদা আলাদা পার্ট ফাইলে লেখা হয়।
+    প্রতিটি পার্ট শেষ হলে manifest.json আপডেট হয়, তাই মাঝপথে থেমে গেলে আবার চালালে সেখান থেকেই শুরু হয়।
+    fresh দিলে আগের পার্টগুলো মুছে নতুন স্ন্যাপশট নেওয়া হয়।"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    manifest = read_json(manifest_path, {"format": "ndjson", "collections": {}})
+    ext = ".ndjson.zst" if zstandard else ".ndjson.gz"
+    if fresh:
+        # একই নামের নতুন পার্ট আগের ইমপোর্টে "শেষ" হিসেবে গণ্য না হয়
+        try: os.remove(os.path.join(out_dir, "import-progress.json"))
+        except OSError: pass
+    for name in names or EXPORT_COLLECTIONS:
+        if fresh and name in manifest["collections"]:
+            for part in manifest["collections"].pop(name)["parts"]:
+                try: os.remove(os.path.join(out_dir, name, part["file"]))
+                except OSError: pass
+        state = manifest["collections"].setdefault(name, {"parts": [], "count": 0, "last_id": None, "done": False})
+        if state["done"]:
+            print(f"Export: {name} already complete in {out_dir} ({state['count']} docs); use --fresh for a new snapshot.")
+            continue
+        os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+        while True:
+            query = {"_id": {"$gt": json_util.loads(state["last_id"])}} if state["last_id"] else {}
+            cursor = EXPORT_COLLECTIONS[name].find(query).sort("_id", 1).limit(EXPORT_PART_DOCS).batch_size(IMPORT_BATCH_DOCS)
+            part_name = f"part-{len(state['parts']):05d}{ext}"
+            part_path = os.path.join(out_dir, name, part_name)
+            written, last_id = 0, None
+            with open_part_for_write(f"{part_path}.tmp") as fh:
+                for doc in cursor:
+                    fh.write((json_util.dumps(doc, json_options=EXPORT_JSON_OPTIONS) + "\n").encode("utf-8"))
+                    written, last_id = written + 1, doc["_id"]
+            if not written:
+                os.remove(f"{part_path}.tmp")
+                break
+            os.replace(f"{part_path}.tmp", part_path)
+            state["parts"].append({"file": part_name, "docs": written})
+            state["count"] += written
+            state["last_id"] = json_util.dumps(last_id)
+            write_json_atomic(manifest_path, manifest)
+            print(f"Export: {name}/{part_name} ({written} docs, {state['count']} total)")
+        state["done"] = True
+        manifest["exported_at"] = datetime.utcnow().isoformat() + "Z"
+        write_json_atomic(manifest_path, manifest)
+    return manifest
+
+def import_catalog(in_dir, names=None):
+    """manifest অনুযায়ী পার্টগুলো insert_many দিয়ে লোড করা হয়; কোন পার্ট শেষ হয়েছে তা
+    import-progress.json এ থাকে, আর আগে থেকে থাকা ডকুমেন্ট (duplicate _id) এড়িয়ে যাওয়া হয়।"""
+    manifest = read_json(os.path.join(in_dir, "manifest.json"))
+    progress_path = os.path.join(in_dir, "import-progress.json")
+    progress = read_json(progress_path, {})
+    for name in names or manifest["collections"]:
+        done_parts = progress.setdefault(name, [])
+        for part in manifest["collections"][name]["parts"]:
+            if part["file"] in done_parts: continue
+            inserted, batch = 0, []
+            with open_part_for_read(os.path.join(in_dir, name, part["file"])) as fh:
+                for line in fh:
+                    batch.append(json_util.loads(line, json_options=EXPORT_JSON_OPTIONS))
+                    if len(batch) >= IMPORT_BATCH_DOCS:
+                        inserted += insert_batch(EXPORT_COLLECTIONS[name], batch)
+                        batch = []
+            if batch: inserted += insert_batch(EXPORT_COLLECTIONS[name], batch)
+            done_parts.append(part["file"])
+            write_json_atomic(progress_path, progress)
+            print(f"Import: {name}/{part['file']} ({inserted} of {part['docs']} docs inserted)")
+    if "movies" in (names or manifest["collections"]):
+        publish_invalidation("catalog", {"*"})
+    return progress
+
+def insert_batch(collection, batch):
+    try:
+        return len(collection.insert_many(batch, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])): raise
+        return e.details.get("nInserted", 0)
+
+# ======================================================================
+# --- সার্ভার মোড: ব্যাকগ্রাউন্ড সার্ভিস চালু করা ---
+# ======================================================================
+server_lock = threading.Lock()
+server_state = {"started": False, "indexes_ready": False}
+INDEX_RETRY_SECONDS = 10
+
+def prepare_database():
+    """ইনডেক্স তৈরি ও এপিসোড মাইগ্রেশন ব্যাকগ্রাউন্ড থ্রেডে হয়; MongoDB না পাওয়া গেলে কিছুক্ষণ পর আবার চেষ্টা করা হয়।"""
+    while True:
+        try:
+            ensure_indexes()
+            server_state["indexes_ready"] = True
+            # পুরনো এমবেডেড এপিসোড থাকলে স্টার্টআপেই সরানো হয়, হাতে CLI চালানোর অপেক্ষা না করে
+            moved = migrate_embedded_episodes()
+            if moved: print(f"Moved {moved} embedded episodes into the episodes collection.")
+            return
+        except Exception as e:
+            print(f"ensure_indexes failed ({e}); retrying in {INDEX_RETRY_SECONDS}s.")
+            time.sleep(INDEX_RETRY_SECONDS)
+
+# --- সিডিউলার লিডার লিজ ---
+# gunicorn -w N এ প্রতিটি ওয়ার্কারের নিজস্ব সিডিউলার থাকে; ক্যাটালগ-ব্যাপী জবগুলো (trending, TMDb,
+# টেলিগ্রাম যাচাই) শুধু যে ওয়ার্কার meta তে লিজ ধরে রেখেছে সেটিতেই চলে।
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEADER_RENEW_SECONDS = 30
+LEADER_LEASE_SECONDS = 90
+leader_state = {"leader": False}
+
+def renew_leader_lease():
+    now = datetime.utcnow()
+    try:
+        meta.update_one({"_id": "scheduler_leader", "$or": [{"owner": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+                        {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=LEADER_LEASE_SECONDS)}}, upsert=True)
+        leader_state["leader"] = True
+    except DuplicateKeyError:
+        # অন্য ওয়ার্কারের লিজ এখনো বহাল
+        leader_state["leader"] = False
+    except Exception as e:
+        print(f"Leader lease renewal failed: {e}")
+        leader_state["leader"] = False
+
+def leader_only(func):
+    @wraps(func)
+    def run():
+        if leader_state["leader"]: return func()
+    return run
+
+def start_background_services():
+    """সিডিউলার, পিরিয়ডিক জব ও ক্যাশ ইনভ্যালিডেশন থ্রেড চালু করে (একবারই)।
+    এখানে MongoDB তে কোনো কল হয় না, তাই প্রথম রিকোয়েস্ট ডাটাবেসের জন্য আটকে থাকে না।"""
+    with server_lock:
+        if server_state["started"]: return
+        scheduler.add_job(func=flush_analytics, trigger='interval', seconds=ANALYTICS_FLUSH_SECONDS, id='flush_analytics', replace_existing=True)
+        scheduler.add_job(func=poll_invalidations, trigger='interval', seconds=INVALIDATION_POLL_SECONDS, id='poll_invalidations', replace_existing=True)
+        scheduler.add_job(func=refresh_health, trigger='interval', seconds=HEALTH_CHECK_SECONDS, id='refresh_health', replace_existing=True, next_run_time=datetime.now())
+        scheduler.add_job(func=renew_leader_lease, trigger='interval', seconds=LEADER_RENEW_SECONDS, id='renew_leader_lease', replace_existing=True, next_run_time=datetime.now())
+        scheduler.add_job(func=leader_only(refresh_trending), trigger='interval', minutes=30, id='refresh_trending', replace_existing=True)
+        scheduler.add_job(func=leader_only(refresh_tmdb_metadata), trigger='interval', hours=TMDB_REFRESH_HOURS, id='refresh_tmdb_metadata', replace_existing=True)
+        scheduler.add_job(func=leader_only(resume_stale_bulk_jobs), trigger='interval', minutes=BULK_STALE_MINUTES, id='resume_stale_bulk_jobs', replace_existing=True)
+        scheduler.add_job(func=leader_only(verify_telegram_files), trigger='interval', minutes=TELEGRAM_VERIFY_MINUTES, id='verify_telegram_files', replace_existing=True)
+        if not scheduler.running: scheduler.start()
+        threading.Thread(target=prepare_database, name="ensure-indexes", daemon=True).start()
+        threading.Thread(target=watch_invalidations, name="cache-invalidation", daemon=True).start()
+        atexit.register(flush_analytics)
+        # সব কিছু সফলভাবে চালু হওয়ার পরেই started চিহ্ন; মাঝপথে ব্যর্থ হলে পরের রিকোয়েস্টে আবার চেষ্টা হবে
+        server_state["started"] = True
+
+@app.before_request
+def ensure_server_mode():
+    # gunicorn এর মতো WSGI সার্ভারে প্রথম রিকোয়েস্টেই সার্ভার মোড চালু হয়; টেস্টে নয়
+    if not server_state["started"] and not app.testing:
+        if check_required_env(): abort(503)
+        start_background_services()
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("export", "import"):
+        # ব্যবহার: python bot.py export [--fresh] <dir> [collection ...] / python bot.py import <dir> [collection ...]
+        args = [a for a in sys.argv[2:] if a != "--fresh"]
+        if not MONGO_URI or not args:
+            print("Usage: python bot.py export [--fresh] <dir> [collection ...] | import <dir> [collection ...] (MONGO_URI must be set)")
+            sys.exit(1)
+        if sys.argv[1] == "export":
+            export_catalog(args[0], args[1:] or None, fresh="--fresh" in sys.argv)
+        else:
+            import_catalog(args[0], args[1:] or None)
+        sys.exit(0)
+    if check_required_env(): sys.exit(1)
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate-episodes":
+        ensure_indexes()
+        print(f"Moved {migrate_embedded_episodes()} episodes into the episodes collection.")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "refresh-tmdb":
+        refresh_tmdb_metadata()
+        sys.exit(0)
+    start_background_services()
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port, debug=False)